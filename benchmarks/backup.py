@@ -0,0 +1,88 @@
+"""Throughput and resumption of parallel backups on a synthetic store"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from filemanager.helpers import backup
+from filemanager.models.exceptions import TransferCancelled
+
+FILES = 2000
+SIZES = (4 * 1024, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024)
+WEIGHTS = (60, 30, 9, 1)
+
+
+def create_store(root: Path) -> int:
+    """Fills a directory with files of mixed sizes, returning the bytes written"""
+
+    root.mkdir()
+    written = 0
+    sizes = random.Random(0).choices(SIZES, WEIGHTS, k=FILES)
+
+    for number, size in enumerate(sizes):
+        (root / f"{number:08x}").write_bytes(os.urandom(size))
+        written += size
+
+    return written
+
+
+def measure(store: Path, destination: Path, workers: int, written: int) -> float:
+    """Prints the throughput of a full snapshot with the workers received"""
+
+    destination.mkdir()
+    start = time.perf_counter()
+    backup.snapshot(store, destination, workers=workers)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{workers:>3} workers  {elapsed:>7.2f} s"
+        f"  {written / (1024 * 1024) / elapsed:>9.1f} MiB/s"
+    )
+
+    return elapsed
+
+
+def measure_resume(store: Path, destination: Path, delay: float) -> None:
+    """Interrupts a snapshot after a delay and prints what the resumed run copied"""
+
+    destination.mkdir()
+    cancel = threading.Event()
+    timer = threading.Timer(delay, cancel.set)
+    timer.start()
+
+    try:
+        backup.snapshot(store, destination, cancel=cancel)
+    except TransferCancelled:
+        pass
+    finally:
+        timer.cancel()
+
+    journal = destination / backup.JOURNAL
+    done = len(journal.read_text().splitlines()) if journal.exists() else FILES
+
+    start = time.perf_counter()
+    backup.snapshot(store, destination)
+    elapsed = time.perf_counter() - start
+
+    print(f"resume     {elapsed:>7.2f} s  {FILES - done} of {FILES} files left")
+
+
+def main() -> None:
+    """Backs up a synthetic store sequentially, in parallel and interrupted"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        folder = Path(directory)
+        written = create_store(folder / "store")
+
+        for workers in (1, backup.WORKERS):
+            destination = folder / f"snapshot_{workers}"
+            elapsed = measure(folder / "store", destination, workers, written)
+
+        measure_resume(folder / "store", folder / "resumed", elapsed / 2)
+
+
+if __name__ == "__main__":
+    main()
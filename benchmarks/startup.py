@@ -0,0 +1,124 @@
+"""Import time of the application and time to its first rows on a synthetic catalog"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ("filemanager", "filemanager.interface.root")
+ROWS = 50000
+RUNS = 5
+
+
+def measure_import(module: str, directory: Path) -> float:
+    """Returns the best wall time of a fresh interpreter importing a module"""
+
+    best = float("inf")
+
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", f"import {module}"],
+            cwd=directory,
+            env=__environment(),
+            check=True,
+        )
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def slowest_imports(
+    module: str, directory: Path, count: int = 5
+) -> List[Tuple[int, str]]:
+    """Returns the packages whose import took longest, in microseconds"""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=directory,
+        env=__environment(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    timings: List[Tuple[int, str]] = list()
+
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        if "." not in name and name.strip() != module:
+            timings.append((int(cumulative), name.strip()))
+
+    return sorted(timings, reverse=True)[:count]
+
+
+def measure_rows(directory: Path) -> None:
+    """Prints the time to read the first page of rows and the whole catalog"""
+
+    # The storage locations derive from the working directory at import time
+    sys.path.insert(0, str(ROOT))
+    os.chdir(directory)
+    (directory / "filemanager" / "database").mkdir(parents=True)
+
+    from filemanager.controller import file_controller
+    from filemanager.database import blob_db, file_db
+    from filemanager.models.entities import File
+
+    file_controller.reset()
+    digest = "0" * 64
+    blob_db.register({digest: 0})
+    file_db.create_many(
+        [
+            File(
+                description=f"document_{number:06d}",
+                modification="2024/01/01 00:00",
+                expiration="2030/01/01" if number % 2 else "",
+                extension="PDF",
+                label=f"label {number % 100}",
+                digest=digest,
+            )
+            for number in range(ROWS)
+        ]
+    )
+
+    start = time.perf_counter()
+    next(file_controller.pages(file_controller.LOAD_PAGE))
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    file_controller.lists()
+    whole = time.perf_counter() - start
+
+    print(f"first page  {first * 1000:>9.1f} ms  ({file_controller.LOAD_PAGE} rows)")
+    print(f"all rows    {whole * 1000:>9.1f} ms  ({ROWS} rows)")
+
+
+def main() -> None:
+    """Measures the cold imports, then the rows shown before the window appears"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        folder = Path(directory)
+
+        for module in MODULES:
+            elapsed = measure_import(module, folder)
+            print(f"import {module:<28} {elapsed * 1000:>9.1f} ms")
+
+            for cumulative, name in slowest_imports(module, folder):
+                print(f"    {name:<30} {cumulative / 1000:>9.1f} ms")
+
+        measure_rows(folder)
+
+
+def __environment() -> Dict[str, str]:
+    """Variables that let a fresh interpreter import the application"""
+
+    paths = [str(ROOT), os.environ.get("PYTHONPATH", "")]
+    return {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, paths))}
+
+
+if __name__ == "__main__":
+    main()
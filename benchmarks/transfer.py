@@ -0,0 +1,50 @@
+"""Throughput of the transfer engine against shutil.copy"""
+
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from filemanager.helpers import transfer
+
+SIZES = (1024 * 1024, 64 * 1024 * 1024, 512 * 1024 * 1024)
+ROUNDS = 3
+
+
+def measure(copy, source: Path, destination: Path) -> float:
+    """Returns the best throughput in MiB/s of several copies"""
+
+    best = float("inf")
+
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        copy(source, destination)
+        best = min(best, time.perf_counter() - start)
+        destination.unlink()
+
+    return source.stat().st_size / (1024 * 1024) / best
+
+
+def main() -> None:
+    """Copies files of several sizes with both methods and prints the results"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        folder = Path(directory)
+
+        for size in SIZES:
+            source = folder / f"source_{size}"
+            with open(source, "wb") as stream:
+                stream.write(b"\0" * size)
+
+            baseline = measure(shutil.copy, source, folder / "baseline")
+            engine = measure(transfer.copy, source, folder / "engine")
+
+            print(
+                f"{size // 1024:>10} KiB"
+                f"  shutil.copy {baseline:>9.1f} MiB/s"
+                f"  transfer.copy {engine:>9.1f} MiB/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
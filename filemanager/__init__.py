@@ -1,21 +1,30 @@
 """Process instantiation module"""
 
+import atexit
 import ctypes
 
 from .controller import file_controller
 from .helpers import util
-from .interface.root import FileManager
 
 
 def create_app():
     """Verify data and instantiates the application with a customised icon"""
 
+    util.recover_reset()
+
     if not (util.DATABASE.exists() and util.STORAGE.exists()):
         file_controller.reset()
+    else:
+        file_controller.prepare()
+
+    atexit.register(file_controller.shutdown)
 
     # Icon in the taskbar: Only work in Windows
     myappid = "filemanager.static.img.favicon"
     ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
 
+    # The interface toolkit is the slowest import, only loaded to show a window
+    from .interface.root import FileManager
+
     file_manager = FileManager()
     return file_manager
@@ -1,65 +1,732 @@
 """Logical module for file management"""
 
-from typing import List
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
-from ..database import file_db
-from ..helpers import util
-from ..models.entities import File
+from ..database import (
+    blob_db,
+    connection,
+    file_db,
+    lease_db,
+    migrations,
+    scan_db,
+    search_db,
+)
+from ..helpers import lease, util
+from ..helpers.cache import ReadCache
+from ..helpers.jobs import Job, Jobs
+from ..helpers.transfer import Progress
+from ..models.entities import BatchResult, Change, Failure, File, ScanReport
+from ..models.exceptions import FileAlreadyExists, FileAlreadyUsed, FileNotValid
 
+COPY_WORKERS = 8
+LOAD_PAGE = 200
+SCAN_WORKERS = 8
 
-def create(file_: File) -> None:
+# Seconds a lease lasts, enough for any change and short after a crash
+LEASE_DURATION = 30.0
+
+# Files younger than this may belong to a creation that is still registering
+SCAN_GRACE = 3600
+
+# Value of a field that a change of several files leaves as each file has it
+KEEP: Any = object()
+
+# Serialises the registration and release of stored contents
+_storage_lock = threading.Lock()
+
+_jobs = Jobs()
+
+# Results of the reads below, until this process or another writes
+_cache = ReadCache(connection.data_version)
+
+
+def create(
+    file_: File,
+    progress: Optional[Progress] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Change:
     """Validates the file before adding it to the database and local storage"""
 
     util.validate_file(file_)
     file = util.format_file(file_)
-    file_db.create(file)
-    util.copy_file(file)
+
+    # The constraint decides, this only avoids copying a file it would refuse
+    if file_db.existing_descriptions([f"{file.description}"]):
+        raise FileAlreadyExists(f"Description '{file.description}' is already used")
+
+    file = util.copy_file(file, progress, cancel)
+
+    with _storage_lock:
+        __register([file])
+        try:
+            file_db.create(file)
+        except Exception:
+            __release()
+            raise
+        finally:
+            _cache.invalidate()
+
+    return Change("insert", file_db.list_by_description([f"{file.description}"]))
+
+
+def create_many(files_: List[File]) -> BatchResult:
+    """Validates and adds several files at once, reporting the ones that fail"""
+
+    failed: List[Failure] = list()
+    candidates: Dict[str, File] = dict()
+
+    for file_ in files_:
+        try:
+            util.validate_file(file_)
+        except FileNotValid as error:
+            failed.append(Failure(file_, error))
+            continue
+
+        file = util.format_file(file_)
+        if file.description in candidates:
+            error = FileAlreadyExists(
+                f"Description '{file.description}' is repeated in the batch"
+            )
+            failed.append(Failure(file_, error))
+            continue
+
+        candidates[f"{file.description}"] = file
+
+    for description in file_db.existing_descriptions(list(candidates)):
+        file = candidates.pop(description)
+        error = FileAlreadyExists(f"Description '{description}' is already used")
+        failed.append(Failure(file, error))
+
+    copied: List[File] = list()
+    contents: Dict[str, List[File]] = dict()
+
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+        hashes = [
+            (file, executor.submit(util.digest_file, file))
+            for file in candidates.values()
+        ]
+
+        for file, future in hashes:
+            try:
+                hashed = future.result()
+            except OSError as error:
+                failed.append(Failure(file, error))
+                continue
+
+            contents.setdefault(f"{hashed.digest}", list()).append(hashed)
+
+        # Files with the same content share a single copy of it
+        copies = [
+            (files, executor.submit(util.store_content, files[0]))
+            for files in contents.values()
+        ]
+
+        for files, future in copies:
+            try:
+                future.result()
+                copied.extend(files)
+            except OSError as error:
+                failed.extend(Failure(file, error) for file in files)
+
+    with _storage_lock:
+        __register(copied)
+        try:
+            file_db.create_many(copied)
+        except Exception:
+            __release()
+            raise
+        finally:
+            _cache.invalidate()
+
+    created = file_db.list_by_description([f"{file.description}" for file in copied])
+
+    return BatchResult(created, failed)
 
 
 def open(file: File) -> None:
-    """Indicates the file to be opened"""
+    """Indicates the file to be opened, keeping the edits made to its copy"""
 
-    util.open_file(file)
+    file = __resolve(file)
+    __reimport(file)
+    util.open_file(__resolve(file))
 
 
-def update(file_: File) -> None:
+def update(file_: File) -> Change:
     """Updates the file information after validation"""
 
-    util.file_used(file_)
     util.validate_file(file_)
     file = util.format_file(file_)
-    file_db.update(file)
-    util.rename_file(file)
+
+    with leased([file]):
+        file_db.update(file)
+        _cache.invalidate()
+
+    # The copy opened before follows the new name unless a program holds it
+    util.rename_opened(file)
+
+    return Change("update", file_db.list_by_id([int(f"{file.id}")]))
+
+
+def update_many(
+    files_: List[File], label: str = KEEP, expiration: str = KEEP
+) -> Change:
+    """Changes the label, the expiration or both of several files at once
+
+    The fields not received keep their value in every file, an empty one is
+    cleared in all of them.
+    """
+
+    if expiration == "":
+        expiration = "//"
+
+    if expiration is not KEEP:
+        util.validate_expiration(expiration)
+
+    changes = {"label": label, "expiration": expiration}
+    changes = {key: value for key, value in changes.items() if value is not KEEP}
+    ids = [int(f"{file.id}") for file in files_]
+
+    if not changes or not ids:
+        return Change("update", list())
+
+    files = [
+        util.format_file(file._replace(**changes)) for file in file_db.list_by_id(ids)
+    ]
+
+    with leased(files):
+        with connection.transaction():
+            file_db.update_many(files)
+        _cache.invalidate()
+
+    return Change("update", file_db.list_by_id(ids))
 
 
 def lists() -> List[File]:
     """Sends the database records"""
 
-    return file_db.list_all()
+    return __cached(("lists",), file_db.list_all)
+
+
+def page(after: Optional[File] = None, size: int = file_db.PAGE_SIZE) -> List[File]:
+    """Sends the records that follow the received one"""
+
+    return file_db.list_page(after, size)
+
+
+def pages(size: int = file_db.PAGE_SIZE) -> Iterator[List[File]]:
+    """Sends the database records lazily, one page at a time"""
+
+    return file_db.iter_pages(size)
+
+
+def count() -> int:
+    """Sends the number of records"""
+
+    return __cached(("count",), file_db.count)
+
+
+def window(
+    offset: int,
+    size: int,
+    column: str = "description",
+    reverse: bool = False,
+    after: Optional[file_db.Anchor] = None,
+) -> Tuple[List[File], Optional[file_db.Anchor]]:
+    """Sends the records at a position of the table ordered by a column
+
+    The position counts from the anchor received, if any, and the anchor of
+    the last record is sent along to read the records that follow.
+    """
+
+    files, anchor = __cached(
+        ("window", offset, size, column, reverse, after),
+        lambda: file_db.list_window(offset, size, column, reverse, after),
+    )
+
+    return list(files), anchor
+
+
+def find(id: int) -> Optional[File]:
+    """Sends the record with the identifier received, if it still exists"""
+
+    files = __cached(("find", id), lambda: file_db.list_by_id([id]))
+
+    return files[0] if files else None
+
+
+def changes() -> int:
+    """Sends a number that changes whenever the records may have changed"""
+
+    return _cache.stamp()
+
+
+def expired() -> List[File]:
+    """Sends the records whose expiration date has been reached"""
+
+    return __cached(("expired",), file_db.list_expired)
+
+
+def expiring(days: int) -> List[File]:
+    """Sends the records that expire within the days received"""
+
+    return __cached(("expiring", days), lambda: file_db.list_expiring(days))
+
+
+def valid() -> List[File]:
+    """Sends the records that have not expired"""
+
+    return __cached(("valid",), file_db.list_valid)
 
 
 def details(file: File) -> List[File]:
     """Sends database records according to description"""
 
-    return file_db.detail(file)
+    return __cached(("details", file.description), lambda: file_db.detail(file))
+
+
+def search_terms(text: str) -> List[str]:
+    """Sends the terms a search for the text looks for"""
+
+    return search_db.terms(text)
+
+
+def search_tokens(file: File) -> Tuple[str, ...]:
+    """Sends the words of a record that searches can match"""
 
+    return search_db.tokens(f"{file.description}", f"{file.label or ''}")
 
-def delete(file: File) -> None:
+
+def search_matches(terms: List[str], tokens: Tuple[str, ...]) -> bool:
+    """Checks without the database whether a record matches the search terms"""
+
+    return search_db.matches(terms, tokens)
+
+
+def search_narrows(broad: List[str], narrow: List[str]) -> bool:
+    """Checks whether a search finds only records that another one found"""
+
+    return search_db.narrows(broad, narrow)
+
+
+def read_only() -> None:
+    """Makes the database reachable only for reading from the current thread"""
+
+    connection.read_only()
+
+
+def delete(file_: File) -> Change:
     """Deletes the file if not in use"""
 
-    util.file_used(file)
-    file_db.delete(file)
-    util.delete_file(file)
+    return delete_many([file_])
+
+
+def delete_many(files_: List[File]) -> Change:
+    """Deletes several files at once if none of them is in use
+
+    Their opened copies and the contents no other file uses are moved aside
+    before the deletion is committed, so a copy or content held by another
+    program cancels the whole deletion instead of losing part of it.
+    """
+
+    ids = [int(f"{file.id}") for file in files_]
+
+    with leased(files_):
+        files = file_db.list_by_id(ids)
+
+        try:
+            opened = util.set_aside_opened(files)
+        except OSError as error:
+            raise __in_use(__holding(files, error), "program")
+
+        with _storage_lock:
+            moved: List[Path] = list()
+            try:
+                with connection.transaction():
+                    file_db.delete_many(ids)
+                    moved = util.set_aside(blob_db.release())
+            except OSError as error:
+                util.put_back(opened)
+                raise __in_use(__holding(files, error), "program")
+            except BaseException:
+                util.put_back(moved)
+                util.put_back(opened)
+                raise
+            finally:
+                _cache.invalidate()
+
+            util.discard_aside(moved + opened)
+
+    return Change("delete", files_)
+
+
+def export_many(
+    files_: List[File],
+    file: File,
+    progress: Optional[Progress] = None,
+    cancel: Optional[threading.Event] = None,
+) -> None:
+    """Indicates the folder to copy several files into, named by description"""
+
+    files = file_db.list_by_id([int(f"{file_.id}") for file_ in files_])
+    util.export_files(files, file, progress, cancel)
+
+
+@contextmanager
+def leased(files: List[File]) -> Iterator[None]:
+    """Holds the files for this process while the block runs
 
+    Takes an advisory lock and a lease on every file at once, or fails with
+    FileAlreadyUsed without holding any if another process is using one.
+    """
 
-def backup(file: File) -> None:
+    by_id = {int(f"{file.id}"): file for file in files}
+    ids = list(by_id)
+
+    locked = lease.acquire(ids)
+    if locked:
+        raise __in_use([by_id[id] for id in locked], "process")
+
+    try:
+        used = lease_db.take(ids, lease.owner(), LEASE_DURATION, lease.host())
+        if used:
+            raise __in_use([by_id[id] for id in used], "process")
+
+        try:
+            yield
+        finally:
+            lease_db.give_back(ids, lease.owner())
+    finally:
+        lease.release(ids)
+
+
+def backup(
+    file: File,
+    progress: Optional[Progress] = None,
+    cancel: Optional[threading.Event] = None,
+) -> None:
     """Indicates the path to generate the backup"""
 
-    util.generate_backup(file)
+    with __database_snapshot() as database:
+        util.generate_backup(file, database, progress, cancel)
+
+
+def archive(file: File, cancel: Optional[threading.Event] = None) -> None:
+    """Indicates the path to generate a single compressed backup"""
+
+    with __database_snapshot() as database:
+        util.generate_archive(file, database, cancel)
+
+
+def restore(file: File) -> None:
+    """Replaces the database and the local storage with a backup folder"""
+
+    with _storage_lock:
+        connection.release()
+        util.restore_backup(file)
+        migrations.migrate()
+        _cache.invalidate()
+
+    # The backup may come from before the storage was sharded
+    threading.Thread(target=shard_storage, daemon=True).start()
+
+
+def restore_archive(file: File) -> None:
+    """Replaces the database and the local storage with a compressed backup"""
+
+    with _storage_lock:
+        connection.release()
+        util.restore_archive(file)
+        migrations.migrate()
+        _cache.invalidate()
+
+    threading.Thread(target=shard_storage, daemon=True).start()
 
 
 def reset() -> None:
     """Delete the database and the local storage to create them again"""
 
-    util.reset_database()
-    file_db.reset_table()
+    with _storage_lock:
+        connection.release()
+        util.reset_database()
+        file_db.reset_table()
+        _cache.invalidate()
+
+
+def prepare() -> None:
+    """Brings an existing database up to date with the current application"""
+
+    migrations.migrate()
+    _cache.invalidate()
+    __collect_opened()
+    threading.Thread(target=shard_storage, daemon=True).start()
+
+
+def shard_storage(pause: float = 0.05) -> int:
+    """Moves the local storage to the sharded layout, batch by batch"""
+
+    total = 0
+
+    while True:
+        with _storage_lock:
+            moved = util.shard_storage()
+
+        if not moved:
+            return total
+
+        total += moved
+        time.sleep(pause)
+
+
+def scan(
+    incremental: bool = False, repair: bool = False, workers: int = SCAN_WORKERS
+) -> ScanReport:
+    """Compares the catalog with the local storage, optionally repairing it
+
+    The storage is read in parallel and the catalog in pages. Every content is
+    hashed again unless incremental, then only the ones whose size or mtime
+    changed since the last scan are. Repair deletes orphan files, corrects the
+    sizes of contents that still match their digest and recounts references;
+    missing and corrupted contents can only be reported.
+    """
+
+    stored = util.scan_storage(workers)
+    contents = {
+        Path(relative).name: relative
+        for relative in stored
+        if util.DIGEST.fullmatch(Path(relative).name)
+    }
+    addressed = set(contents.values())
+    strays = [relative for relative in stored if relative not in addressed]
+
+    missing: List[File] = list()
+    mismatched: Dict[str, int] = dict()
+    corrupted: List[str] = list()
+    checked = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for blobs in blob_db.iter_pages():
+            known = scan_db.checked([digest for digest, _ in blobs])
+            absent: List[str] = list()
+            pending: Dict[str, Tuple[int, int]] = dict()
+
+            for digest, size in blobs:
+                relative = contents.pop(digest, None)
+                if relative is None:
+                    absent.append(digest)
+                    continue
+
+                status = stored[relative]
+                state = (status.st_size, status.st_mtime_ns)
+                if status.st_size != size:
+                    mismatched[digest] = status.st_size
+                if not incremental or known.get(digest) != state:
+                    pending[digest] = state
+
+            verified: Dict[str, Tuple[int, int]] = dict()
+            results = executor.map(util.verify_content, pending)
+            for digest, valid in zip(pending, results):
+                if valid:
+                    verified[digest] = pending[digest]
+                else:
+                    corrupted.append(digest)
+
+            checked += len(pending)
+            scan_db.record(verified)
+
+            if absent:
+                missing.extend(file_db.list_by_digest(absent))
+
+    missing.extend(file_db.list_unstored())
+
+    limit = time.time() - SCAN_GRACE
+    orphans = sorted(
+        relative
+        for relative in [*contents.values(), *strays]
+        if stored[relative].st_mtime < limit
+    )
+
+    miscounted = blob_db.miscounted()
+
+    if repair:
+        sizes = {
+            digest: size
+            for digest, size in mismatched.items()
+            if digest not in corrupted
+        }
+        with _storage_lock:
+            __repair(orphans, sizes)
+
+    return ScanReport(
+        orphans=orphans,
+        missing=missing,
+        mismatched=sorted(mismatched),
+        corrupted=corrupted,
+        miscounted=miscounted,
+        checked=checked,
+        repaired=repair,
+    )
+
+
+def submit(
+    function: Callable[..., Any], *args: Any, name: str = "", **kwargs: Any
+) -> Job:
+    """Runs an operation of this module in the background, returning its handle"""
+
+    return _jobs.submit(name or function.__name__, function, *args, **kwargs)
+
+
+def jobs() -> List[Job]:
+    """Sends the operations running in the background and the latest finished"""
+
+    return _jobs.list()
+
+
+def finished_jobs() -> List[Job]:
+    """Sends the background operations that finished since the last call"""
+
+    return _jobs.poll()
+
+
+def shutdown() -> None:
+    """Stops the background operations and releases the database"""
+
+    _jobs.shutdown()
+    connection.close_all()
+
+
+@contextmanager
+def __database_snapshot() -> Iterator[Path]:
+    """Provides a consistent copy of the database that is deleted afterwards"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(directory) / util.DATABASE.name
+        connection.snapshot(database)
+        yield database
+
+
+def __cached(key: Tuple[Any, ...], load: Callable[[], Any]) -> Any:
+    """Answers a read from memory when nothing wrote since it was last made
+
+    The day is part of the key, since the records say whether they expired.
+    """
+
+    value = _cache.get((time.strftime("%Y-%m-%d"), *key), load)
+
+    # Callers receive their own list, the kept one must not change
+    return list(value) if isinstance(value, list) else value
+
+
+def __resolve(file: File) -> File:
+    """Completes the file with the digest of its stored content"""
+
+    return file._replace(digest=file_db.digest(file))
+
+
+def __in_use(files: List[File], user: str) -> FileAlreadyUsed:
+    """Builds the error naming the files another process or program is using"""
+
+    names = ", ".join(
+        f"'{file.description}.{f'{file.extension}'.lower()}'" for file in files
+    )
+
+    if len(files) == 1:
+        return FileAlreadyUsed(f"The file {names} is being used by another {user}.")
+
+    return FileAlreadyUsed(f"The files {names} are being used by another {user}.")
+
+
+def __holding(files: List[File], error: OSError) -> List[File]:
+    """Finds the files whose content or opened copy could not be moved"""
+
+    path = Path(f"{error.filename}")
+    held = [
+        file
+        for file in files
+        if f"{file.digest}" in path.name or path.name == f"{file.id}"
+    ]
+
+    return held or files
+
+
+def __reimport(file: File) -> None:
+    """Stores the opened copy of a file as its new content if it was edited
+
+    The copy is compared with the content it was made from, not with the
+    current one, so only edits made through the copy are brought back.
+    """
+
+    path = util.opened_copy(file)
+    base = util.opened_base(file)
+    if path is None or base is None:
+        return None
+
+    edited = util.copy_file(file._replace(path=path))
+    if edited.digest == base:
+        return None
+
+    with leased([file]):
+        with _storage_lock:
+            __register([edited])
+            file_db.update_content(util.format_file(edited))
+            util.rebase_opened(file, f"{edited.digest}")
+            _cache.invalidate()
+            __release()
+
+
+def __collect_opened() -> None:
+    """Keeps the edits made to the copies opened before, then deletes them
+
+    A copy whose edits cannot be stored now, because the file is being used
+    or the copy is still held by a program, stays for the next start. The copy
+    of a file deleted since then is deleted with it.
+    """
+
+    util.discard_legacy_opened()
+
+    for id in util.opened_ids():
+        try:
+            for file in file_db.list_by_id([id]):
+                __reimport(file)
+        except (FileAlreadyUsed, OSError):
+            continue
+
+        util.discard_opened(File(id=id))
+
+
+def __register(files: List[File]) -> None:
+    """Records the stored contents of the files before referencing them"""
+
+    for file in files:
+        if not util.blob_path(f"{file.digest}").exists():
+            util.copy_file(file)
+
+    blob_db.register({f"{file.digest}": util.stored_size(file) for file in files})
+
+
+def __release() -> None:
+    """Deletes the stored contents that are no longer referenced"""
+
+    util.delete_files([File(digest=digest) for digest in blob_db.release()])
+
+
+def __repair(orphans: List[str], sizes: Dict[str, int]) -> None:
+    """Removes orphan files and brings the catalog in line with the storage"""
+
+    registered = set(blob_db.existing([Path(relative).name for relative in orphans]))
+
+    for relative in orphans:
+        if Path(relative).name not in registered:
+            util.discard_stored(relative)
+
+    with connection.transaction():
+        blob_db.resize(sizes)
+        blob_db.recount()
+        scan_db.forget_missing()
+
+    __release()
@@ -0,0 +1,134 @@
+"""Database management for the blobs table, the contents of the local storage"""
+
+import json
+from typing import Dict, Iterator, List, Tuple
+
+from .connection import fetch_all, fetch_many, fetch_none, transaction
+
+PAGE_SIZE = 1000
+
+
+def register(blobs: Dict[str, int]) -> None:
+    """Records stored contents by digest and size, without references yet"""
+
+    query = """
+        INSERT OR IGNORE INTO blobs (digest, size, refs)
+        VALUES (:digest, :size, 0)
+        """
+    parameters = [{"digest": digest, "size": size} for digest, size in blobs.items()]
+    fetch_many(query, parameters)
+
+
+def release() -> List[str]:
+    """Forgets the contents no file refers to and returns their digests"""
+
+    with transaction():
+        query = "SELECT digest FROM blobs WHERE refs <= 0"
+        records = fetch_all(query)
+
+        query = "DELETE FROM blobs WHERE refs <= 0"
+        fetch_none(query)
+
+    return [record[0] for record in records]
+
+
+def existing(digests: List[str]) -> List[str]:
+    """Returns which of the digests received are registered"""
+
+    query = """
+        SELECT digest FROM blobs
+        WHERE digest IN (SELECT value FROM json_each(?))
+        """
+    parameters = json.dumps(digests)
+
+    records = fetch_all(query, parameters)
+
+    return [record[0] for record in records]
+
+
+def iter_pages(size: int = PAGE_SIZE) -> Iterator[List[Tuple[str, int]]]:
+    """Yields the digest and size of every stored content, page by page"""
+
+    query = """
+        SELECT digest, size FROM blobs
+        WHERE digest > :after
+        ORDER BY digest
+        LIMIT :size
+        """
+    page = fetch_all(query, {"after": "", "size": size})
+
+    while page:
+        yield [(record[0], record[1]) for record in page]
+
+        if len(page) < size:
+            return
+
+        page = fetch_all(query, {"after": page[-1][0], "size": size})
+
+
+def miscounted() -> List[str]:
+    """Returns the contents whose reference count disagrees with the documents"""
+
+    query = """
+        SELECT digest FROM blobs
+        WHERE refs != (SELECT count(*) FROM documents WHERE blob = blobs.digest)
+        """
+    records = fetch_all(query)
+
+    return [record[0] for record in records]
+
+
+def recount() -> None:
+    """Recomputes the reference count of every content from the documents"""
+
+    query = """
+        UPDATE blobs
+        SET refs = (SELECT count(*) FROM documents WHERE blob = blobs.digest)
+        """
+    fetch_none(query)
+
+
+def resize(blobs: Dict[str, int]) -> None:
+    """Corrects the recorded size of stored contents"""
+
+    query = "UPDATE blobs SET size = :size WHERE digest = :digest"
+    parameters = [{"digest": digest, "size": size} for digest, size in blobs.items()]
+    fetch_many(query, parameters)
+
+
+def create_table() -> None:
+    """Creates the blobs table and the triggers that count its references"""
+
+    query = """
+        CREATE TABLE IF NOT EXISTS blobs (
+            digest TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            refs INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE TRIGGER IF NOT EXISTS blobs_reference
+        AFTER INSERT ON documents WHEN new.blob IS NOT NULL BEGIN
+            UPDATE blobs SET refs = refs + 1 WHERE digest = new.blob;
+        END
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE TRIGGER IF NOT EXISTS blobs_dereference
+        AFTER DELETE ON documents WHEN old.blob IS NOT NULL BEGIN
+            UPDATE blobs SET refs = refs - 1 WHERE digest = old.blob;
+        END
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE TRIGGER IF NOT EXISTS blobs_replace
+        AFTER UPDATE OF blob ON documents BEGIN
+            UPDATE blobs SET refs = refs - 1 WHERE digest = old.blob;
+            UPDATE blobs SET refs = refs + 1 WHERE digest = new.blob;
+        END
+        """
+    fetch_none(query)
@@ -1,50 +1,275 @@
 """Communications with the database"""
 
 import sqlite3
+import threading
+import time
+import weakref
 from contextlib import contextmanager
-from typing import Any, Dict, Iterator, List, Optional
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from ..helpers import util
+from . import instrumentation
+
+STATEMENT_CACHE = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+
+class Handle:
+    """Connection of one thread, closed by the collector when the thread ends
+
+    The thread-local storage keeps the only strong reference, so finishing a
+    thread releases its handle. The busy lock is held for every statement and
+    transaction, which lets other threads close it only between them.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, generation: int) -> None:
+        self.connection: Optional[sqlite3.Connection] = connection
+        self.generation = generation
+        self.busy = threading.RLock()
+
+    def close(self, optimize: bool = False) -> None:
+        """Waits for the statement in progress and closes the connection"""
+
+        with self.busy:
+            connection, self.connection = self.connection, None
+
+            if connection is None:
+                return
+
+            try:
+                if optimize:
+                    connection.execute("PRAGMA optimize")
+            except sqlite3.Error:
+                pass
+            finally:
+                connection.close()
+
+
+_local = threading.local()
+_lock = threading.Lock()
+_handles: "weakref.WeakSet[Handle]" = weakref.WeakSet()
+_generation = 0
 
 
 def fetch_all(query: str, parameters: Optional[Any] = None) -> List[Any]:
     """Executes a query returning all rows in the found set"""
 
+    if parameters is not None and not isinstance(parameters, dict):
+        parameters = [parameters]
+
     with __get_cursor() as cursor:
-        if parameters is None:
-            cursor.execute(query)
-        else:
-            cursor.execute(query, [parameters])
-        return cursor.fetchall()
+        start = time.perf_counter()
+        cursor.execute(query, () if parameters is None else parameters)
+        records = cursor.fetchall()
+        elapsed = time.perf_counter() - start
+
+        instrumentation.record(
+            cursor.connection, query, parameters, elapsed, len(records)
+        )
+        return records
 
 
 def fetch_one(query: str, parameters: str) -> Any:
     """Executes a query returning one row in the found set"""
 
     with __get_cursor() as cursor:
+        start = time.perf_counter()
         cursor.execute(query, [parameters])
-        return cursor.fetchone()
+        record = cursor.fetchone()
+        elapsed = time.perf_counter() - start
+
+        instrumentation.record(
+            cursor.connection, query, [parameters], elapsed, int(record is not None)
+        )
+        return record
 
 
 def fetch_none(query: str, parameters: Optional[Dict[str, Any]] = None) -> None:
     """Executes a query without returning values"""
 
     with __get_cursor() as cursor:
-        if parameters is None:
-            cursor.execute(query)
-        else:
-            cursor.execute(query, parameters)
+        start = time.perf_counter()
+        cursor.execute(query, () if parameters is None else parameters)
+        elapsed = time.perf_counter() - start
+
+        instrumentation.record(
+            cursor.connection, query, parameters, elapsed, cursor.rowcount
+        )
+
+
+def fetch_many(query: str, parameters: Iterable[Dict[str, Any]]) -> None:
+    """Executes a query for every set of parameters in a single transaction"""
+
+    with __get_cursor() as cursor:
+        start = time.perf_counter()
+        cursor.executemany(query, parameters)
+        elapsed = time.perf_counter() - start
+
+        instrumentation.record(cursor.connection, query, None, elapsed, cursor.rowcount)
 
 
 @contextmanager
-def __get_cursor() -> Iterator[sqlite3.Cursor]:
-    """Allows working with database connection"""
+def transaction() -> Iterator[None]:
+    """Groups the queries executed inside it into a single atomic commit"""
+
+    if getattr(_local, "depth", 0):
+        _local.depth += 1
+        try:
+            yield
+        finally:
+            _local.depth -= 1
+        return
+
+    with __hold_connection() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        _local.depth = 1
+        try:
+            yield
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            _local.depth = 0
+
+
+def read_only() -> None:
+    """Forbids writes through the connection of the current thread"""
+
+    _local.read_only = True
+
+    with __hold_connection() as connection:
+        connection.execute("PRAGMA query_only = ON")
+
+
+def data_version() -> Tuple[int, int]:
+    """Returns a stamp of the current connection that changes with other commits
+
+    SQLite changes the data version of a connection whenever another one,
+    from this process or any other, commits a change to the database.
+    """
+
+    with __hold_connection() as connection:
+        version = connection.execute("PRAGMA data_version").fetchone()[0]
+
+    return _local.handle.generation, version
+
 
-    connection: sqlite3.Connection = sqlite3.connect(util.DATABASE)
-    cursor: sqlite3.Cursor = connection.cursor()
+def snapshot(destination: Path) -> None:
+    """Copies a consistent image of the database with the online backup API"""
+
+    target = sqlite3.connect(destination)
     try:
-        yield cursor
-        connection.commit()
+        with __hold_connection() as connection:
+            connection.backup(target)
     finally:
-        cursor.close()
-        connection.close()
+        target.close()
+
+
+def close_all() -> None:
+    """Optimizes and closes every open connection when the application exits"""
+
+    for handle in __retire():
+        handle.close(optimize=True)
+
+
+def release() -> None:
+    """Closes every open connection before the database file is replaced
+
+    Each one is closed once its statement or transaction in progress ends, the
+    next query of its thread opens a new one on the replaced file.
+    """
+
+    for handle in __retire():
+        handle.close()
+
+
+def __retire() -> List[Handle]:
+    """Takes every handle out of use so the next query opens a new connection"""
+
+    global _generation
+
+    with _lock:
+        _generation += 1
+        handles = list(_handles)
+        _handles.clear()
+
+    return handles
+
+
+def __open_handle() -> Handle:
+    """Opens a tuned connection that is closed when its thread ends"""
+
+    connection = sqlite3.connect(
+        util.DATABASE,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE,
+    )
+
+    for pragma in PRAGMAS:
+        connection.execute(pragma)
+
+    if getattr(_local, "read_only", False):
+        connection.execute("PRAGMA query_only = ON")
+
+    instrumentation.record_open()
+
+    with _lock:
+        handle = Handle(connection, _generation)
+        _handles.add(handle)
+
+    weakref.finalize(handle, connection.close)
+
+    return handle
+
+
+@contextmanager
+def __hold_connection() -> Iterator[sqlite3.Connection]:
+    """Provides the connection of the current thread, kept open while in use"""
+
+    while True:
+        handle: Optional[Handle] = getattr(_local, "handle", None)
+
+        if handle is None or handle.connection is None:
+            _local.handle = handle = __open_handle()
+
+        with handle.busy:
+            # Closed by another thread between the check and the lock
+            if handle.connection is not None:
+                yield handle.connection
+                return
+
+
+@contextmanager
+def __get_cursor() -> Iterator[sqlite3.Cursor]:
+    """Allows working with database connection"""
+
+    with __hold_connection() as connection:
+        cursor: sqlite3.Cursor = connection.cursor()
+
+        # Inside a transaction the commit belongs to whoever opened it
+        if getattr(_local, "depth", 0):
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+            return
+
+        try:
+            yield cursor
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
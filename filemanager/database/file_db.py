@@ -1,88 +1,420 @@
 """Database management for the documents table"""
 
-from typing import Any, List
+import json
+import sqlite3
+from typing import Any, Iterator, List, Optional, Set, Tuple
 
 from ..models.entities import File
 from ..models.exceptions import FileAlreadyExists
-from .connection import fetch_all, fetch_none, fetch_one
+from . import migrations, search_db
+from .connection import fetch_all, fetch_many, fetch_none, fetch_one
+
+PAGE_SIZE = 500
+
+COLUMNS = """
+    id, description, modification, expiration, extension, label, blob,
+    coalesce(expires_on <= date('now', 'localtime'), 0) AS expired
+    """
+
+# Expression each column of the table is ordered by, all of them indexed and
+# never empty, so that a window can start right after the row of an anchor
+ORDER = {
+    "description": "description",
+    "modification": "coalesce(modified_on, '')",
+    "expiration": "coalesce(expires_on, '')",
+    "extension": "coalesce(extension, '')",
+    "label": "coalesce(label, '') COLLATE NOCASE",
+}
+
+# Value of the ordered column and identifier of a row, where a window ends
+Anchor = Tuple[Any, int]
 
 
 def create(file: File) -> None:
     """Create a new file"""
 
-    if __file_exists("description", file.description):  # type: ignore
+    query = """
+        INSERT INTO documents
+            (description, modification, expiration, extension, label, expires_on, blob)
+        VALUES (
+            :description, :modification, :expiration, :extension, :label,
+            nullif(replace(:expiration, '/', '-'), ''), :digest
+        )
+        """
+
+    parameters = file._asdict()
+
+    try:
+        fetch_none(query, parameters)
+    except sqlite3.IntegrityError as error:
+        if not __repeated_description(error):
+            raise
         raise FileAlreadyExists(f"Description '{file.description}' is already used")
 
+
+def create_many(files: List[File]) -> None:
+    """Create several files in a single transaction"""
+
     query = """
         INSERT INTO documents
-        VALUES (:description, :modification, :expiration, :extension, :label)
+            (description, modification, expiration, extension, label, expires_on, blob)
+        VALUES (
+            :description, :modification, :expiration, :extension, :label,
+            nullif(replace(:expiration, '/', '-'), ''), :digest
+        )
         """
 
-    parameters = file._asdict()
-    fetch_none(query, parameters)
+    parameters = [file._asdict() for file in files]
+
+    try:
+        fetch_many(query, parameters)
+    except sqlite3.IntegrityError as error:
+        if not __repeated_description(error):
+            raise
+        raise FileAlreadyExists(f"A description in the batch is already used: {error}")
+
+
+def existing_descriptions(descriptions: List[str]) -> Set[str]:
+    """Returns which of the descriptions received are already used"""
+
+    query = """
+        SELECT description FROM documents
+        WHERE description IN (SELECT value FROM json_each(?))
+        """
+    parameters = json.dumps(descriptions)
+
+    records = fetch_all(query, parameters)
+
+    return {record[0] for record in records}
 
 
 def list_all() -> List[File]:
     """Return all files in the table"""
 
-    query = "SELECT oid, * FROM documents ORDER BY description"
+    query = f"SELECT {COLUMNS} FROM documents ORDER BY description, id"
     records = fetch_all(query)
 
     return __package_files(records)
 
 
+def list_page(after: Optional[File] = None, size: int = PAGE_SIZE) -> List[File]:
+    """Return the page of files that follows the one received, by description"""
+
+    if after is None:
+        query = f"""
+            SELECT {COLUMNS} FROM documents
+            ORDER BY description, id
+            LIMIT :size
+            """
+        parameters = {"size": size}
+    else:
+        query = f"""
+            SELECT {COLUMNS} FROM documents
+            WHERE (description, id) > (:description, :id)
+            ORDER BY description, id
+            LIMIT :size
+            """
+        parameters = {
+            "description": after.description,
+            "id": after.id,
+            "size": size,
+        }
+
+    records = fetch_all(query, parameters)
+
+    return __package_files(records)
+
+
+def iter_pages(size: int = PAGE_SIZE) -> Iterator[List[File]]:
+    """Yields all files in the table page by page, without holding them all"""
+
+    page = list_page(size=size)
+
+    while page:
+        yield page
+
+        if len(page) < size:
+            return
+
+        page = list_page(page[-1], size)
+
+
+def count() -> int:
+    """Return the number of files"""
+
+    query = "SELECT count(*) FROM documents"
+    records = fetch_all(query)
+
+    return records[0][0]
+
+
+def list_window(
+    offset: int,
+    size: int,
+    column: str = "description",
+    reverse: bool = False,
+    after: Optional[Anchor] = None,
+) -> Tuple[List[File], Optional[Anchor]]:
+    """Return the files at a position of the table ordered by a column
+
+    The position counts from the row of the anchor when one is received, so
+    the index goes straight to it instead of skipping every previous row.
+    Returns the anchor of the last file too, to read the next window.
+    """
+
+    expression = ORDER[column]
+    direction = "DESC" if reverse else "ASC"
+    parameters = {"size": size, "offset": offset}
+
+    if after is None:
+        condition = ""
+    else:
+        condition = f"WHERE {__following(expression, reverse)}"
+        parameters.update({"value": after[0], "id": after[1]})
+
+    query = f"""
+        SELECT {COLUMNS}, {expression} FROM documents
+        {condition}
+        ORDER BY {expression} {direction}, id {direction}
+        LIMIT :size OFFSET :offset
+        """
+
+    records = fetch_all(query, parameters)
+    anchor = (records[-1][-1], records[-1][0]) if records else None
+
+    return __package_files(records), anchor
+
+
 def detail(file: File) -> List[File]:
-    """Returns all files that match with the description"""
+    """Returns the files whose description or label match, best ranked first"""
+
+    if not search_db.match_expression(f"{file.description}"):
+        return list_all()
+
+    records = search_db.search(f"{file.description}", COLUMNS)
+
+    return __package_files(records)
 
-    query = "SELECT oid, * FROM documents WHERE description LIKE ?"
-    parameters = f"%{file.description}%"
+
+def list_expired() -> List[File]:
+    """Return the files whose expiration date has been reached"""
+
+    query = f"""
+        SELECT {COLUMNS} FROM documents
+        WHERE expires_on <= date('now', 'localtime')
+        ORDER BY expires_on, description
+        """
+    records = fetch_all(query)
+
+    return __package_files(records)
+
+
+def list_expiring(days: int) -> List[File]:
+    """Return the files that will expire within the number of days received"""
+
+    query = f"""
+        SELECT {COLUMNS} FROM documents
+        WHERE expires_on > date('now', 'localtime')
+            AND expires_on <= date('now', 'localtime', :days || ' days')
+        ORDER BY expires_on, description
+        """
+    parameters = {"days": f"+{days}"}
 
     records = fetch_all(query, parameters)
 
     return __package_files(records)
 
 
+def list_valid() -> List[File]:
+    """Return the files without expiration or not yet expired"""
+
+    query = f"""
+        SELECT {COLUMNS} FROM documents
+        WHERE expires_on IS NULL OR expires_on > date('now', 'localtime')
+        ORDER BY description, id
+        """
+    records = fetch_all(query)
+
+    return __package_files(records)
+
+
+def digest(file: File) -> Optional[str]:
+    """Return the digest of the stored content of a file"""
+
+    query = "SELECT blob FROM documents WHERE id = ?"
+    parameters = f"{file.id}"
+
+    record = fetch_one(query, parameters)
+
+    return record[0] if record else None
+
+
+def list_by_id(ids: List[int]) -> List[File]:
+    """Return the files with the identifiers received"""
+
+    query = f"""
+        SELECT {COLUMNS} FROM documents
+        WHERE id IN (SELECT value FROM json_each(?))
+        ORDER BY description, id
+        """
+    parameters = json.dumps(ids)
+
+    records = fetch_all(query, parameters)
+
+    return __package_files(records)
+
+
+def list_by_description(descriptions: List[str]) -> List[File]:
+    """Return the files with the descriptions received"""
+
+    query = f"""
+        SELECT {COLUMNS} FROM documents
+        WHERE description IN (SELECT value FROM json_each(?))
+        ORDER BY description, id
+        """
+    parameters = json.dumps(descriptions)
+
+    records = fetch_all(query, parameters)
+
+    return __package_files(records)
+
+
+def list_by_digest(digests: List[str]) -> List[File]:
+    """Return the files whose stored content is one of the digests received"""
+
+    query = f"""
+        SELECT {COLUMNS} FROM documents
+        WHERE blob IN (SELECT value FROM json_each(?))
+        ORDER BY description, id
+        """
+    parameters = json.dumps(digests)
+
+    records = fetch_all(query, parameters)
+
+    return __package_files(records)
+
+
+def list_unstored() -> List[File]:
+    """Return the files without a registered stored content"""
+
+    query = f"""
+        SELECT {COLUMNS} FROM documents
+        WHERE blob IS NULL OR blob NOT IN (SELECT digest FROM blobs)
+        ORDER BY description, id
+        """
+    records = fetch_all(query)
+
+    return __package_files(records)
+
+
 def update(file: File) -> None:
     """Update data of a selected file"""
 
     query = """
         UPDATE documents
-        SET description = :description, modification = :modification, expiration = :expiration, label = :label
-        WHERE oid = :id
+        SET description = :description, modification = :modification, expiration = :expiration, label = :label,
+            expires_on = nullif(replace(:expiration, '/', '-'), '')
+        WHERE id = :id
         """
 
     parameters = file._asdict()
+
+    try:
+        fetch_none(query, parameters)
+    except sqlite3.IntegrityError as error:
+        if not __repeated_description(error):
+            raise
+        raise FileAlreadyExists(f"Description '{file.description}' is already used")
+
+
+def update_content(file: File) -> None:
+    """Point a file to another stored content"""
+
+    query = """
+        UPDATE documents
+        SET blob = :digest, modification = :modification
+        WHERE id = :id
+        """
+    parameters = file._asdict()
     fetch_none(query, parameters)
 
 
+def update_many(files: List[File]) -> None:
+    """Update data of several files in a single transaction"""
+
+    query = """
+        UPDATE documents
+        SET modification = :modification, expiration = :expiration, label = :label,
+            expires_on = nullif(replace(:expiration, '/', '-'), '')
+        WHERE id = :id
+        """
+
+    parameters = [file._asdict() for file in files]
+    fetch_many(query, parameters)
+
+
 def delete(file: File) -> None:
     """Delete a selected file"""
 
-    query = "DELETE FROM documents WHERE oid = :id"
+    query = "DELETE FROM documents WHERE id = :id"
     parameters = file._asdict()
     fetch_none(query, parameters)
 
 
+def delete_many(ids: List[int]) -> None:
+    """Delete several files in a single statement"""
+
+    query = """
+        DELETE FROM documents
+        WHERE id IN (SELECT value FROM json_each(:ids))
+        """
+    parameters = {"ids": json.dumps(ids)}
+    fetch_none(query, parameters)
+
+
 def reset_table() -> None:
     """Re-create the document table, if it already exists, delete it"""
 
+    query = "DROP TABLE IF EXISTS documents_search"
+    fetch_none(query)
+
+    query = "DROP TABLE IF EXISTS documents_substring"
+    fetch_none(query)
+
     query = "DROP TABLE IF EXISTS documents"
     fetch_none(query)
 
-    fields = "(description text, modification text, expiration text, extension text, label text)"
-    query = f"CREATE TABLE IF NOT EXISTS documents {fields}"
+    query = "DROP TABLE IF EXISTS blobs"
     fetch_none(query)
 
+    query = "DROP TABLE IF EXISTS scan_state"
+    fetch_none(query)
 
-def __file_exists(field: str, value: str) -> bool:
-    """Check if a parameter exists"""
+    query = "DROP TABLE IF EXISTS leases"
+    fetch_none(query)
 
-    query = f"SELECT oid, description from documents WHERE {field}=?"
-    parameters = value
+    query = "PRAGMA user_version = 0"
+    fetch_none(query)
 
-    record = fetch_one(query, parameters)
+    migrations.migrate()
+
+
+def __following(expression: str, reverse: bool) -> str:
+    """Condition of the rows ordered after an anchor
+
+    The first comparison alone is what lets SQLite search an index on an
+    expression, the second one leaves out the rows up to the anchor itself.
+    """
+
+    sign = "<" if reverse else ">"
+
+    return f"{expression} {sign}= :value AND ({expression}, id) {sign} (:value, :id)"
+
+
+def __repeated_description(error: sqlite3.IntegrityError) -> bool:
+    """Checks if a failed statement broke the uniqueness of the description"""
 
-    return bool(record)
+    return "UNIQUE constraint failed: documents.description" in str(error)
 
 
 def __package_files(records: List[Any]) -> List[File]:
@@ -98,6 +430,8 @@ def __package_files(records: List[Any]) -> List[File]:
             expiration=record[3],
             extension=record[4],
             label=record[5],
+            digest=record[6],
+            expired=bool(record[7]),
         )
         files.append(file)
 
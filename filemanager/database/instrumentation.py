@@ -0,0 +1,166 @@
+"""Measurements of the queries executed against the database"""
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+from bisect import bisect_left
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..helpers import util
+from ..models.entities import QueryStats
+
+# Upper bounds, in milliseconds, of the latency histogram buckets
+BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 50.0, 100.0, 500.0, 1000.0, float("inf"))
+
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_LOG = util.DATABASE.with_name("slow_queries.jsonl")
+SLOW_QUERY_LOG_SIZE = 1024 * 1024
+SLOW_QUERY_LOG_COUNT = 3
+
+_lock = threading.Lock()
+_statements: Dict[str, List[Any]] = dict()
+_opens = 0
+_threshold = SLOW_QUERY_THRESHOLD
+_logger = logging.getLogger("filemanager.database.slow_queries")
+_logger.propagate = False
+
+
+def configure(
+    threshold: Optional[float] = None, log_path: Optional[Path] = None
+) -> None:
+    """Changes the seconds that make a query slow and where they are written"""
+
+    global _threshold
+
+    if threshold is not None:
+        _threshold = threshold
+
+    if log_path is not None:
+        for handler in list(_logger.handlers):
+            _logger.removeHandler(handler)
+            handler.close()
+        __add_handler(log_path)
+
+
+def record_open() -> None:
+    """Counts a new connection to the database"""
+
+    global _opens
+
+    with _lock:
+        _opens += 1
+
+
+def record(
+    connection: sqlite3.Connection,
+    query: str,
+    parameters: Any,
+    elapsed: float,
+    rows: int,
+) -> None:
+    """Accumulates the latency and rows of a statement, logging it if slow"""
+
+    statement = " ".join(query.split())
+    milliseconds = elapsed * 1000
+    bucket = bisect_left(BUCKETS, milliseconds)
+
+    with _lock:
+        stats = _statements.get(statement)
+        if stats is None:
+            stats = _statements[statement] = [0, 0.0, 0.0, 0, [0] * len(BUCKETS)]
+        stats[0] += 1
+        stats[1] += milliseconds
+        stats[2] = max(stats[2], milliseconds)
+        stats[3] += max(rows, 0)
+        stats[4][bucket] += 1
+
+    if elapsed >= _threshold:
+        __log_slow_query(connection, statement, parameters, milliseconds, rows)
+
+
+def statistics() -> Dict[str, QueryStats]:
+    """Returns the accumulated measurements of every statement"""
+
+    with _lock:
+        return {
+            statement: QueryStats(
+                calls=stats[0],
+                total_ms=stats[1],
+                max_ms=stats[2],
+                rows=stats[3],
+                histogram=tuple(zip(BUCKETS, stats[4])),
+            )
+            for statement, stats in _statements.items()
+        }
+
+
+def connections_opened() -> int:
+    """Returns how many connections have been opened"""
+
+    return _opens
+
+
+def reset() -> None:
+    """Discards the measurements accumulated so far"""
+
+    global _opens
+
+    with _lock:
+        _statements.clear()
+        _opens = 0
+
+
+def __log_slow_query(
+    connection: sqlite3.Connection,
+    statement: str,
+    parameters: Any,
+    milliseconds: float,
+    rows: int,
+) -> None:
+    """Writes the statement with its parameters and query plan to the log"""
+
+    if not _logger.handlers:
+        __add_handler(SLOW_QUERY_LOG)
+
+    entry = {
+        "statement": statement,
+        "parameters": parameters,
+        "milliseconds": round(milliseconds, 3),
+        "rows": rows,
+        "plan": __query_plan(connection, statement, parameters),
+    }
+    _logger.warning(json.dumps(entry, default=str))
+
+
+def __query_plan(
+    connection: sqlite3.Connection, statement: str, parameters: Any
+) -> List[Tuple[Any, ...]]:
+    """Asks SQLite how it solves the statement"""
+
+    if not re.match(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", statement, re.I):
+        return list()
+
+    try:
+        query = f"EXPLAIN QUERY PLAN {statement}"
+        cursor = connection.execute(query, () if parameters is None else parameters)
+        return [tuple(row) for row in cursor.fetchall()]
+    except sqlite3.Error:
+        return list()
+
+
+def __add_handler(log_path: Path) -> None:
+    """Sends the slow queries to a rotating file with one JSON object per line"""
+
+    handler = RotatingFileHandler(
+        log_path,
+        maxBytes=SLOW_QUERY_LOG_SIZE,
+        backupCount=SLOW_QUERY_LOG_COUNT,
+        encoding="utf-8",
+        delay=True,
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
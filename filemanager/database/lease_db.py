@@ -0,0 +1,69 @@
+"""Database management for the leases table, the files being changed"""
+
+import json
+import time
+from typing import List
+
+from .connection import fetch_all, fetch_many, fetch_none, transaction
+
+
+def take(ids: List[int], owner: str, duration: float, host: str = "") -> List[int]:
+    """Leases the files to the owner, unless another one holds some of them
+
+    Leases that were not returned in time are ignored, so those of a crashed
+    process expire on their own; so are the ones of other processes of the
+    host, when its advisory locks already proved them gone. Returns the files
+    held by others, in which case none is leased.
+    """
+
+    now = time.time()
+
+    with transaction():
+        query = "DELETE FROM leases WHERE expires <= :now"
+        fetch_none(query, {"now": now})
+
+        query = """
+            SELECT file_id FROM leases
+            WHERE file_id IN (SELECT value FROM json_each(:ids)) AND owner != :owner
+                AND (:host = '' OR owner NOT LIKE :host || ':%')
+            """
+        parameters = {"ids": json.dumps(ids), "owner": owner, "host": host}
+        records = fetch_all(query, parameters)
+
+        if records:
+            return [record[0] for record in records]
+
+        query = """
+            INSERT OR REPLACE INTO leases (file_id, owner, expires)
+            VALUES (:file_id, :owner, :expires)
+            """
+        leases = [
+            {"file_id": id, "owner": owner, "expires": now + duration} for id in ids
+        ]
+        fetch_many(query, leases)
+
+    return list()
+
+
+def give_back(ids: List[int], owner: str) -> None:
+    """Ends the leases the owner holds on the files"""
+
+    query = """
+        DELETE FROM leases
+        WHERE file_id IN (SELECT value FROM json_each(:ids)) AND owner = :owner
+        """
+    parameters = {"ids": json.dumps(ids), "owner": owner}
+    fetch_none(query, parameters)
+
+
+def create_table() -> None:
+    """Creates the table of the files leased to a process"""
+
+    query = """
+        CREATE TABLE IF NOT EXISTS leases (
+            file_id INTEGER PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires REAL NOT NULL
+        )
+        """
+    fetch_none(query)
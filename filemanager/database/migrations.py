@@ -0,0 +1,297 @@
+"""Versioned evolution of the database schema"""
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ..helpers import util
+from . import blob_db, lease_db, scan_db, search_db
+from .connection import fetch_all, fetch_many, fetch_none, transaction
+
+# A migration may return work to do once its transaction has been committed
+Finish = Optional[Callable[[], None]]
+
+
+def migrate() -> None:
+    """Applies, in order, every migration newer than the database version"""
+
+    version = current_version()
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with transaction():
+            finish = migration()
+            fetch_none(f"PRAGMA user_version = {number}")
+
+        if finish is not None:
+            finish()
+
+
+def current_version() -> int:
+    """Returns the number of migrations already applied to the database"""
+
+    query = "PRAGMA user_version"
+    return int(fetch_all(query)[0][0])
+
+
+def __initial_schema() -> Finish:
+    """Documents table as created by the first versions of the application"""
+
+    fields = "(description text, modification text, expiration text, extension text, label text)"
+    query = f"CREATE TABLE IF NOT EXISTS documents {fields}"
+    fetch_none(query)
+
+    search_db.rebuild()
+
+    return None
+
+
+def __typed_and_unique_documents() -> Finish:
+    """Typed documents table with a stable key and a unique description"""
+
+    query = """
+        CREATE TABLE documents_new (
+            id INTEGER PRIMARY KEY,
+            description TEXT NOT NULL UNIQUE,
+            modification TEXT,
+            expiration TEXT,
+            extension TEXT,
+            label TEXT
+        )
+        """
+    fetch_none(query)
+
+    # The last row of a repeated description keeps it, the others are renamed
+    query = """
+        INSERT INTO documents_new (id, description, modification, expiration, extension, label)
+        SELECT oid, description, modification, expiration, extension, label
+        FROM documents
+        WHERE oid IN (SELECT max(oid) FROM documents GROUP BY description)
+        """
+    fetch_none(query)
+
+    renamed, strays = __rename_repeated()
+
+    query = """
+        INSERT INTO documents_new (id, description, modification, expiration, extension, label)
+        SELECT oid, :description, modification, expiration, extension, label
+        FROM documents
+        WHERE oid = :id
+        """
+    fetch_many(query, [{"id": id, "description": new} for id, new in renamed.items()])
+
+    fetch_none("DROP TABLE documents_search")
+    fetch_none("DROP TABLE IF EXISTS documents_substring")
+    fetch_none("DROP TABLE documents")
+    fetch_none("ALTER TABLE documents_new RENAME TO documents")
+
+    search_db.rebuild()
+
+    def discard() -> None:
+        for relative in strays:
+            util.discard_stored(relative)
+
+    return discard
+
+
+def __rename_repeated() -> Tuple[Dict[int, str], List[str]]:
+    """Gives every older row of a repeated description a name of its own
+
+    The rows get the description followed by their identifier and the stored
+    file under their old name gets the new one too, so none loses its content.
+    Returns the new descriptions and the old names no remaining row uses.
+    """
+
+    query = "SELECT oid, description, extension FROM documents ORDER BY oid DESC"
+    records = fetch_all(query)
+
+    used: Set[str] = {record[1] for record in records}
+    seen: Set[str] = set()
+    kept: Set[str] = set()
+    renamed: Dict[int, str] = dict()
+    moved: Set[str] = set()
+
+    for id, description, extension in records:
+        if description not in seen:
+            seen.add(description)
+            kept.add(f"{description}.{extension}")
+            continue
+
+        new = f"{description}_{id}"
+        while new in used:
+            new = f"{new}_{id}"
+
+        used.add(new)
+        renamed[id] = new
+        util.duplicate_stored(f"{description}.{extension}", f"{new}.{extension}")
+        moved.add(f"{description}.{extension}")
+
+    return renamed, sorted(moved - kept)
+
+
+def __sortable_expiration() -> Finish:
+    """Indexed ISO copy of the expiration date to evaluate expiry in queries"""
+
+    query = "ALTER TABLE documents ADD COLUMN expires_on TEXT"
+    fetch_none(query)
+
+    query = "UPDATE documents SET expires_on = nullif(replace(expiration, '/', '-'), '')"
+    fetch_none(query)
+
+    query = "CREATE INDEX documents_expires_on ON documents (expires_on)"
+    fetch_none(query)
+
+    return None
+
+
+def __content_addressed_storage() -> Finish:
+    """Stored files addressed by the digest of their content, shared by reference"""
+
+    blob_db.create_table()
+
+    query = "ALTER TABLE documents ADD COLUMN blob TEXT REFERENCES blobs (digest)"
+    fetch_none(query)
+
+    query = "CREATE INDEX documents_blob ON documents (blob)"
+    fetch_none(query)
+
+    query = "SELECT id, description, extension FROM documents"
+    records = fetch_all(query)
+
+    adopted: List[Tuple[Path, str]] = list()
+
+    for id, description, extension in records:
+        source = util.STORAGE / f"{description}.{extension}"
+        if not source.exists():
+            continue
+
+        digest = util.adopt_file(source)
+        blob_db.register({digest: util.blob_path(digest).stat().st_size})
+
+        query = "UPDATE documents SET blob = :digest WHERE id = :id"
+        fetch_none(query, {"digest": digest, "id": id})
+
+        adopted.append((source, digest))
+
+    def retire() -> None:
+        for source, digest in adopted:
+            util.retire_file(source, digest)
+
+    return retire
+
+
+def __scan_state() -> Finish:
+    """Side table remembering what the consistency scanner already verified"""
+
+    scan_db.create_table()
+
+    return None
+
+
+def __leases() -> Finish:
+    """Table of the files a process is changing"""
+
+    lease_db.create_table()
+
+    return None
+
+
+def __sortable_columns() -> Finish:
+    """Indexes that keep the table ordered by any of its columns"""
+
+    query = "CREATE INDEX documents_modification ON documents (modification, id)"
+    fetch_none(query)
+
+    query = "CREATE INDEX documents_extension ON documents (extension, id)"
+    fetch_none(query)
+
+    query = "CREATE INDEX documents_label ON documents (label COLLATE NOCASE, id)"
+    fetch_none(query)
+
+    return None
+
+
+def __sortable_modification() -> Finish:
+    """Modification date in a 24 hour clock, so that it sorts as a date"""
+
+    hour = """
+        CAST(
+            substr(modification, 12, instr(substr(modification, 12), ':') - 1)
+            AS INTEGER
+        )
+        """
+    query = f"""
+        ALTER TABLE documents ADD COLUMN modified_on TEXT GENERATED ALWAYS AS (
+            replace(substr(modification, 1, 10), '/', '-') || printf(
+                ' %02d:%s',
+                CASE
+                    WHEN upper(modification) LIKE '%M'
+                    THEN {hour} % 12 + 12 * (upper(modification) LIKE '%PM')
+                    ELSE {hour}
+                END,
+                substr(modification, 12 + instr(substr(modification, 12), ':'), 2)
+            )
+        ) VIRTUAL
+        """
+    fetch_none(query)
+
+    query = "CREATE INDEX documents_modified_on ON documents (modified_on, id)"
+    fetch_none(query)
+
+    query = "DROP INDEX documents_modification"
+    fetch_none(query)
+
+    return None
+
+
+def __keyset_order() -> Finish:
+    """Indexes ordering the empty values first, to read the table from any row"""
+
+    query = """
+        CREATE INDEX documents_order_modification
+        ON documents (coalesce(modified_on, ''), id)
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE INDEX documents_order_expiration
+        ON documents (coalesce(expires_on, ''), id)
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE INDEX documents_order_extension
+        ON documents (coalesce(extension, ''), id)
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE INDEX documents_order_label
+        ON documents (coalesce(label, '') COLLATE NOCASE, id)
+        """
+    fetch_none(query)
+
+    for index in ("modified_on", "extension", "label"):
+        fetch_none(f"DROP INDEX documents_{index}")
+
+    return None
+
+
+def __substring_search() -> Finish:
+    """Trigram index to find the words that contain the searched terms"""
+
+    search_db.rebuild()
+
+    return None
+
+
+MIGRATIONS: List[Callable[[], Finish]] = [
+    __initial_schema,
+    __typed_and_unique_documents,
+    __sortable_expiration,
+    __content_addressed_storage,
+    __scan_state,
+    __leases,
+    __sortable_columns,
+    __sortable_modification,
+    __keyset_order,
+    __substring_search,
+]
@@ -0,0 +1,55 @@
+"""Database management for the scan_state table, the last consistency scan"""
+
+import json
+from typing import Dict, List, Tuple
+
+from .connection import fetch_all, fetch_many, fetch_none
+
+
+def checked(digests: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Returns the size and mtime each content had when it was last verified"""
+
+    query = """
+        SELECT digest, size, mtime_ns FROM scan_state
+        WHERE digest IN (SELECT value FROM json_each(?))
+        """
+    parameters = json.dumps(digests)
+
+    records = fetch_all(query, parameters)
+
+    return {record[0]: (record[1], record[2]) for record in records}
+
+
+def record(states: Dict[str, Tuple[int, int]]) -> None:
+    """Remembers the size and mtime of contents that were just verified"""
+
+    query = """
+        INSERT OR REPLACE INTO scan_state (digest, size, mtime_ns, verified)
+        VALUES (:digest, :size, :mtime_ns, datetime('now'))
+        """
+    parameters = [
+        {"digest": digest, "size": size, "mtime_ns": mtime_ns}
+        for digest, (size, mtime_ns) in states.items()
+    ]
+    fetch_many(query, parameters)
+
+
+def forget_missing() -> None:
+    """Discards the state of contents that are no longer registered"""
+
+    query = "DELETE FROM scan_state WHERE digest NOT IN (SELECT digest FROM blobs)"
+    fetch_none(query)
+
+
+def create_table() -> None:
+    """Creates the table that keeps the state of the last verification"""
+
+    query = """
+        CREATE TABLE IF NOT EXISTS scan_state (
+            digest TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            verified TEXT NOT NULL
+        )
+        """
+    fetch_none(query)
@@ -0,0 +1,265 @@
+"""Full-text search index over the description and label of the documents"""
+
+import json
+import re
+import sqlite3
+import unicodedata
+from typing import Any, List, Tuple
+
+from .connection import fetch_all, fetch_none
+
+# Characters that form a token, as the unicode61 tokenizer splits them
+TOKEN = re.compile(r"[^\W_]+")
+
+# Weights given to each indexed column when ranking with bm25
+DESCRIPTION_WEIGHT = 10.0
+LABEL_WEIGHT = 1.0
+
+# Shortest term the trigram index can find inside a word
+SUBSTRING_LENGTH = 3
+
+# The trigram tokenizer exists since SQLite 3.34
+TRIGRAM = sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def search(text: str, columns: str) -> List[Any]:
+    """Returns the columns of the matching documents, the most similar first
+
+    The index finds the words that start with every term, ranked by bm25.
+    When every term is long enough, the trigram index also finds the words
+    that only contain them, like "invoice" for "voice", which follow the
+    ranked ones. Without it, the documents are read only if nothing matched.
+    """
+
+    query = f"""
+        SELECT {columns}
+        FROM documents
+        JOIN (
+            SELECT rowid AS match_id,
+                bm25(documents_search, {DESCRIPTION_WEIGHT}, {LABEL_WEIGHT}) AS score
+            FROM documents_search
+            WHERE documents_search MATCH :match
+        ) ON documents.oid = match_id
+        ORDER BY score
+        """
+    parameters = {"match": match_expression(text)}
+
+    records = fetch_all(query, parameters)
+
+    if __inside_words(terms(text)):
+        return records + __search_contained(text, columns)
+
+    # Without the trigram index the documents are read only as a last resort
+    if not records and not TRIGRAM and __long_enough(terms(text)):
+        return __scan_contained(text, columns)
+
+    return records
+
+
+def match_expression(text: str) -> str:
+    """Turns free text into an expression where every term is a prefix"""
+
+    return " ".join(f'"{term}"*' for term in terms(text))
+
+
+def terms(text: str) -> List[str]:
+    """Splits free text into the terms the index looks for"""
+
+    return TOKEN.findall(__fold(text))
+
+
+def tokens(description: str, label: str) -> Tuple[str, ...]:
+    """Returns the tokens the index keeps for a document"""
+
+    return tuple(TOKEN.findall(__fold(f"{description} {label}")))
+
+
+def matches(terms: List[str], tokens: Tuple[str, ...]) -> bool:
+    """Checks in memory whether a document matches, as the search would"""
+
+    if __inside_words(terms):
+        return all(any(term in token for token in tokens) for term in terms)
+
+    return all(any(token.startswith(term) for token in tokens) for term in terms)
+
+
+def narrows(broad: List[str], narrow: List[str]) -> bool:
+    """Checks whether a search finds only documents another one found"""
+
+    if __inside_words(broad):
+        return all(any(old in new for new in narrow) for old in broad)
+
+    # Words that only contain the terms are never found by the broad search
+    if __inside_words(narrow):
+        return False
+
+    return all(any(new.startswith(old) for new in narrow) for old in broad)
+
+
+def create_index() -> None:
+    """Creates the search table and the triggers that keep it synchronised"""
+
+    query = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS documents_search
+        USING fts5(
+            description,
+            label,
+            content='documents',
+            content_rowid='oid',
+            tokenize="unicode61 remove_diacritics 2",
+            prefix='2 3'
+        )
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE TRIGGER IF NOT EXISTS documents_search_insert
+        AFTER INSERT ON documents BEGIN
+            INSERT INTO documents_search(rowid, description, label)
+            VALUES (new.oid, new.description, new.label);
+        END
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE TRIGGER IF NOT EXISTS documents_search_delete
+        AFTER DELETE ON documents BEGIN
+            INSERT INTO documents_search(documents_search, rowid, description, label)
+            VALUES ('delete', old.oid, old.description, old.label);
+        END
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE TRIGGER IF NOT EXISTS documents_search_update
+        AFTER UPDATE OF description, label ON documents BEGIN
+            INSERT INTO documents_search(documents_search, rowid, description, label)
+            VALUES ('delete', old.oid, old.description, old.label);
+            INSERT INTO documents_search(rowid, description, label)
+            VALUES (new.oid, new.description, new.label);
+        END
+        """
+    fetch_none(query)
+
+    if TRIGRAM:
+        __create_substring_index()
+
+
+def rebuild() -> None:
+    """Creates the indexes if necessary and refills them from the documents table"""
+
+    create_index()
+
+    query = "INSERT INTO documents_search(documents_search) VALUES ('rebuild')"
+    fetch_none(query)
+
+    if TRIGRAM:
+        query = """
+            INSERT INTO documents_substring(documents_substring) VALUES ('rebuild')
+            """
+        fetch_none(query)
+
+
+def __create_substring_index() -> None:
+    """Creates the trigram table that finds terms inside words and its triggers"""
+
+    query = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS documents_substring
+        USING fts5(
+            description,
+            label,
+            content='documents',
+            content_rowid='oid',
+            tokenize='trigram'
+        )
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE TRIGGER IF NOT EXISTS documents_substring_insert
+        AFTER INSERT ON documents BEGIN
+            INSERT INTO documents_substring(rowid, description, label)
+            VALUES (new.oid, new.description, new.label);
+        END
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE TRIGGER IF NOT EXISTS documents_substring_delete
+        AFTER DELETE ON documents BEGIN
+            INSERT INTO documents_substring(documents_substring, rowid, description, label)
+            VALUES ('delete', old.oid, old.description, old.label);
+        END
+        """
+    fetch_none(query)
+
+    query = """
+        CREATE TRIGGER IF NOT EXISTS documents_substring_update
+        AFTER UPDATE OF description, label ON documents BEGIN
+            INSERT INTO documents_substring(documents_substring, rowid, description, label)
+            VALUES ('delete', old.oid, old.description, old.label);
+            INSERT INTO documents_substring(rowid, description, label)
+            VALUES (new.oid, new.description, new.label);
+        END
+        """
+    fetch_none(query)
+
+
+def __search_contained(text: str, columns: str) -> List[Any]:
+    """Returns the documents found by the trigram index and not by the other"""
+
+    query = f"""
+        SELECT {columns}
+        FROM documents
+        WHERE oid IN (
+            SELECT rowid FROM documents_substring
+            WHERE documents_substring MATCH :contains
+        )
+        AND oid NOT IN (
+            SELECT rowid FROM documents_search
+            WHERE documents_search MATCH :match
+        )
+        ORDER BY description
+        """
+    parameters = {
+        "contains": " AND ".join(f'"{term}"' for term in terms(text)),
+        "match": match_expression(text),
+    }
+
+    return fetch_all(query, parameters)
+
+
+def __scan_contained(text: str, columns: str) -> List[Any]:
+    """Returns the documents whose description or label contain every term"""
+
+    query = f"""
+        SELECT {columns}
+        FROM documents
+        WHERE NOT EXISTS (
+            SELECT 1 FROM json_each(:terms)
+            WHERE instr(lower(description || ' ' || coalesce(label, '')), value) = 0
+        )
+        ORDER BY description
+        """
+    parameters = {"terms": json.dumps(terms(text))}
+
+    return fetch_all(query, parameters)
+
+
+def __inside_words(terms: List[str]) -> bool:
+    """Checks whether a search looks for the terms inside words too"""
+
+    return TRIGRAM and __long_enough(terms)
+
+
+def __long_enough(terms: List[str]) -> bool:
+    """Checks whether every term is long enough to be looked for inside words"""
+
+    return bool(terms) and all(len(term) >= SUBSTRING_LENGTH for term in terms)
+
+
+def __fold(text: str) -> str:
+    """Lowers the text and removes its diacritics, like the tokenizer does"""
+
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
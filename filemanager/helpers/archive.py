@@ -0,0 +1,132 @@
+"""Single-file backups as tar archives compressed in parallel blocks"""
+
+import gzip
+import os
+import tarfile
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Deque, List, Optional, Tuple
+
+from ..models.exceptions import TransferCancelled
+
+SUFFIX = ".tar.gz"
+BLOCK = 4 * 1024 * 1024
+LEVEL = 6
+WORKERS = os.cpu_count() or 2
+
+
+class ParallelGzipWriter:
+    """Writable stream that compresses each block as an independent gzip member
+
+    Concatenated gzip members are a valid gzip file, so the result can be read
+    by any gzip tool while the blocks are compressed by several threads.
+    """
+
+    def __init__(self, stream: BinaryIO, workers: int = WORKERS) -> None:
+        self.stream = stream
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending: Deque[Future] = deque()
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        """Collects data, sending every complete block to be compressed"""
+
+        self.buffer += data
+
+        while len(self.buffer) >= BLOCK:
+            self.__submit(bytes(self.buffer[:BLOCK]))
+            del self.buffer[:BLOCK]
+
+        return len(data)
+
+    def close(self) -> None:
+        """Compresses what remains and writes every block in order"""
+
+        if self.buffer:
+            self.__submit(bytes(self.buffer))
+            self.buffer.clear()
+
+        while self.pending:
+            self.stream.write(self.pending.popleft().result())
+
+        self.executor.shutdown()
+
+    def abort(self) -> None:
+        """Discards the blocks not yet written"""
+
+        for future in self.pending:
+            future.cancel()
+
+        self.pending.clear()
+        self.executor.shutdown()
+
+    def __submit(self, block: bytes) -> None:
+        """Queues a block, writing finished ones to keep memory bounded"""
+
+        self.pending.append(self.executor.submit(self.__compress, block))
+
+        while len(self.pending) > self.workers * 2:
+            self.stream.write(self.pending.popleft().result())
+
+    @staticmethod
+    def __compress(block: bytes) -> bytes:
+        """Compresses a block into a complete gzip member"""
+
+        compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(block) + compressor.flush()
+
+
+def write_archive(
+    destination: Path,
+    members: List[Tuple[Path, str]],
+    cancel: Optional[threading.Event] = None,
+    workers: int = WORKERS,
+) -> None:
+    """Streams files and directories into a compressed archive
+
+    The archive is written under a temporary name and only appears, complete,
+    once every member has been compressed.
+    """
+
+    temporary = destination.with_name(f".{destination.name}.part")
+
+    try:
+        with open(temporary, "wb") as stream:
+            writer = ParallelGzipWriter(stream, workers)
+            try:
+                with tarfile.open(fileobj=writer, mode="w|") as tar:  # type: ignore
+                    for path, name in members:
+                        tar.add(path, arcname=name, filter=__cancellable(cancel))
+            except BaseException:
+                writer.abort()
+                raise
+            writer.close()
+        os.replace(temporary, destination)
+    finally:
+        temporary.unlink(missing_ok=True)
+
+
+def read_archive(source: Path, destination: Path) -> None:
+    """Extracts an archive member by member, without loading it into memory"""
+
+    with gzip.open(source, "rb") as stream:
+        with tarfile.open(fileobj=stream, mode="r|") as tar:  # type: ignore
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(destination, filter="data")
+            else:
+                tar.extractall(destination)
+
+
+def __cancellable(cancel: Optional[threading.Event]):
+    """Filter of members that stops the archive when cancellation is requested"""
+
+    def check(member: tarfile.TarInfo) -> tarfile.TarInfo:
+        if cancel is not None and cancel.is_set():
+            raise TransferCancelled("The backup was cancelled")
+        return member
+
+    return check
@@ -0,0 +1,295 @@
+"""Backups of the local storage as snapshots that only copy what changed"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from ..models.exceptions import FileNotValid, TransferCancelled
+from . import transfer
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+JOURNAL = "journal.jsonl"
+
+# Copies wait on the disk rather than the processor, so more threads than cores
+WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+Manifest = Dict[str, Any]
+Entry = Dict[str, Any]
+
+
+def snapshot(
+    source: Path,
+    destination: Path,
+    previous: Optional[Path] = None,
+    database: Optional[Path] = None,
+    cancel: Optional[threading.Event] = None,
+    workers: int = WORKERS,
+    progress: Optional[transfer.Progress] = None,
+) -> Manifest:
+    """Creates a complete copy of the source, linking what the previous kept
+
+    Every snapshot is a full tree that can be browsed on its own, files that
+    did not change since the previous snapshot are hard links to its copies.
+    The files are copied in parallel, the largest first, and a journal records
+    each one so that an interrupted snapshot resumes where it stopped.
+    """
+
+    before = read_manifest(previous) if previous else None
+    known: Dict[str, Entry] = before["files"] if before else dict()
+    origin = previous / source.name if previous else None
+
+    files: Dict[str, Entry] = dict()
+    changes: Dict[str, Any] = {"added": [], "changed": [], "removed": [], "linked": 0}
+
+    for line in __read_journal(destination):
+        files[line["file"]] = line["entry"]
+        __count(changes, line["action"], line["file"])
+
+    pending = [item for item in walk(source) if item[0] not in files]
+    pending.sort(key=lambda item: item[1].st_size, reverse=True)
+    total = len(files) + len(pending)
+
+    def back_up(relative: str, status: os.stat_result) -> Tuple[str, Entry, str]:
+        tree = destination / source.name
+        return __back_up_file(source, tree, origin, relative, status, known, cancel)
+
+    with open(destination / JOURNAL, "a", encoding="utf-8") as journal:
+        for future in __run_parallel(back_up, pending, workers):
+            relative, entry, action = future.result()
+            files[relative] = entry
+            __count(changes, action, relative)
+            line = {"file": relative, "entry": entry, "action": action}
+            __write_journal(journal, line)
+
+            if progress is not None:
+                progress(len(files), total)
+
+    if database is not None:
+        transfer.copy(database, destination / database.name)
+
+    changes["removed"] = sorted(set(known) - set(files))
+
+    manifest: Manifest = {
+        "version": MANIFEST_VERSION,
+        "created": time.time(),
+        "source": source.name,
+        "database": database.name if database else None,
+        "previous": os.path.relpath(previous, destination) if previous else None,
+        "files": files,
+        "changes": changes,
+    }
+
+    __write_manifest(destination, manifest)
+    (destination / JOURNAL).unlink()
+
+    return manifest
+
+
+def restore(
+    snapshot: Path,
+    destination: Path,
+    cancel: Optional[threading.Event] = None,
+    workers: int = WORKERS,
+) -> Manifest:
+    """Copies a snapshot into a directory, resuming an interrupted restore"""
+
+    try:
+        manifest = read_manifest(snapshot)
+    except (OSError, ValueError):
+        raise FileNotValid(f"The folder '{snapshot}' is not a backup")
+
+    header = {"snapshot": str(snapshot.resolve())}
+    lines = __read_journal(destination)
+
+    if lines and lines[0] != header:
+        shutil.rmtree(destination)
+        lines = list()
+
+    destination.mkdir(parents=True, exist_ok=True)
+    done = {line["file"] for line in lines[1:]}
+
+    pending = [
+        (relative, entry["size"])
+        for relative, entry in manifest["files"].items()
+        if relative not in done
+    ]
+    pending.sort(key=lambda item: item[1], reverse=True)
+
+    def restore_file(relative: str, size: int) -> str:
+        if cancel is not None and cancel.is_set():
+            raise TransferCancelled("The restore was cancelled")
+
+        target = destination / manifest["source"] / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        transfer.copy(snapshot / manifest["source"] / relative, target)
+        return relative
+
+    with open(destination / JOURNAL, "a", encoding="utf-8") as journal:
+        if not lines:
+            __write_journal(journal, header)
+
+        for future in __run_parallel(restore_file, pending, workers):
+            __write_journal(journal, {"file": future.result()})
+
+    (destination / manifest["source"]).mkdir(exist_ok=True)
+
+    if manifest.get("database"):
+        transfer.copy(
+            snapshot / manifest["database"], destination / manifest["database"]
+        )
+
+    (destination / JOURNAL).unlink()
+
+    return manifest
+
+
+def latest(backups: Path) -> Optional[Path]:
+    """Returns the most recent finished snapshot inside the backups"""
+
+    found: Optional[Tuple[float, Path]] = None
+
+    for path in backups.glob(f"*/*/{MANIFEST}"):
+        try:
+            created = float(read_manifest(path.parent)["created"])
+        except (OSError, ValueError, KeyError):
+            continue
+
+        if found is None or created > found[0]:
+            found = (created, path.parent)
+
+    return found[1] if found else None
+
+
+def unfinished(backups: Path) -> Optional[Path]:
+    """Returns a snapshot that was interrupted before completing, if any"""
+
+    for path in backups.glob(f"*/*/{JOURNAL}"):
+        if not (path.parent / MANIFEST).exists():
+            return path.parent
+
+    return None
+
+
+def read_manifest(snapshot: Path) -> Manifest:
+    """Returns the description of the content of a snapshot"""
+
+    with open(snapshot / MANIFEST, encoding="utf-8") as stream:
+        return json.load(stream)
+
+
+def walk(root: Path) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yields the relative path and status of every file below a directory"""
+
+    pending = [root]
+
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    relative = Path(entry.path).relative_to(root).as_posix()
+                    yield relative, entry.stat(follow_symlinks=False)
+
+
+def __back_up_file(
+    source: Path,
+    tree: Path,
+    origin: Optional[Path],
+    relative: str,
+    status: os.stat_result,
+    known: Dict[str, Entry],
+    cancel: Optional[threading.Event],
+) -> Tuple[str, Entry, str]:
+    """Links or copies one file into the snapshot, returning what was done"""
+
+    if cancel is not None and cancel.is_set():
+        raise TransferCancelled("The backup was cancelled")
+
+    entry: Entry = {"size": status.st_size, "mtime_ns": status.st_mtime_ns}
+    old = known.get(relative)
+    touched = not old or any(old[key] != entry[key] for key in entry)
+
+    if touched:
+        entry["digest"] = transfer.digest(source / relative)
+    else:
+        entry["digest"] = old["digest"]  # type: ignore
+
+    target = tree / relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.unlink(missing_ok=True)
+
+    if old and old["digest"] == entry["digest"] and origin is not None:
+        try:
+            os.link(origin / relative, target)
+            return relative, entry, "linked"
+        except OSError:
+            pass
+
+    transfer.copy(source / relative, target)
+    return relative, entry, "changed" if old else "added"
+
+
+def __run_parallel(
+    function: Callable[..., Any], tasks: List[Tuple[Any, ...]], workers: int
+) -> Iterator[Future]:
+    """Runs the tasks on a pool of threads, yielding them as they finish"""
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [executor.submit(function, *task) for task in tasks]
+
+    try:
+        yield from as_completed(futures)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def __count(changes: Dict[str, Any], action: str, relative: str) -> None:
+    """Adds what was done with a file to the summary of changes"""
+
+    if action == "linked":
+        changes["linked"] += 1
+    else:
+        changes[action].append(relative)
+
+
+def __read_journal(destination: Path) -> List[Dict[str, Any]]:
+    """Returns the lines of the journal of an interrupted run"""
+
+    lines: List[Dict[str, Any]] = list()
+
+    try:
+        with open(destination / JOURNAL, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    lines.append(json.loads(line))
+                except ValueError:
+                    break
+    except FileNotFoundError:
+        pass
+
+    return lines
+
+
+def __write_journal(journal: TextIO, line: Dict[str, Any]) -> None:
+    """Records a finished step so that it is not repeated when resuming"""
+
+    journal.write(json.dumps(line) + "\n")
+    journal.flush()
+
+
+def __write_manifest(destination: Path, manifest: Manifest) -> None:
+    """Writes the manifest under a temporary name, then publishes it"""
+
+    temporary = destination / f".{MANIFEST}.tmp"
+
+    with open(temporary, "w", encoding="utf-8") as stream:
+        json.dump(manifest, stream, indent=1)
+
+    os.replace(temporary, destination / MANIFEST)
@@ -0,0 +1,109 @@
+"""Results of reads kept in memory until something writes"""
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+MAX_BYTES = 64 * 1024 * 1024
+MAX_ENTRIES = 256
+
+
+class ReadCache:
+    """Least recently used results, discarded as a whole by any write
+
+    Writes of this process bump the generation. Writes of other processes are
+    noticed through the version received, which each thread compares with the
+    last one it saw before answering from memory. A result read while the
+    generation changed is returned but not kept, since it may predate the write.
+    """
+
+    def __init__(
+        self,
+        version: Callable[[], Hashable],
+        max_bytes: int = MAX_BYTES,
+        max_entries: int = MAX_ENTRIES,
+    ) -> None:
+        self.version = version
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self.bytes = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """Returns the result kept for a key, loading and keeping it if missing"""
+
+        self.__check()
+
+        with self.lock:
+            generation = self.generation
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+
+        value = load()
+        size = self.__size(value)
+
+        with self.lock:
+            if generation == self.generation and size <= self.max_bytes:
+                self.__store(key, value, size)
+
+        return value
+
+    def stamp(self) -> int:
+        """Returns the generation, after noticing the writes made elsewhere"""
+
+        self.__check()
+        return self.generation
+
+    def invalidate(self) -> None:
+        """Forgets every result, the next reads go to the database"""
+
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.bytes = 0
+
+    def __check(self) -> None:
+        """Forgets every result if something else wrote since this thread looked"""
+
+        version = self.version()
+        seen: Optional[Hashable] = getattr(self.local, "version", None)
+        self.local.version = version
+
+        if version != seen:
+            self.invalidate()
+
+    def __store(self, key: Hashable, value: Any, size: int) -> None:
+        """Keeps a result, dropping the least recently used ones to make room"""
+
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+
+        self.entries[key] = (value, size)
+        self.bytes += size
+
+        while self.bytes > self.max_bytes or len(self.entries) > self.max_entries:
+            _, (_, dropped) = self.entries.popitem(last=False)
+            self.bytes -= dropped
+
+    @staticmethod
+    def __size(value: Any) -> int:
+        """Estimates the memory held by a result and the values inside it"""
+
+        size = sys.getsizeof(value)
+
+        if isinstance(value, (list, tuple)):
+            size += sum(ReadCache.__size(item) for item in value)
+
+        return size
@@ -0,0 +1,161 @@
+"""Operations run on a pool of threads and followed through their handles"""
+
+import inspect
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from ..models.exceptions import TransferCancelled
+
+WORKERS = 4
+
+# Finished jobs remembered after the interface received them
+HISTORY = 20
+
+_ids = itertools.count(1)
+
+
+class Job:
+    """Handle of an operation submitted to run in the background
+
+    The worker writes the progress and the outcome, the interface only reads
+    them, so no lock is needed between both.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.id = next(_ids)
+        self.name = name
+        self.state = "pending"
+        self.done = 0
+        self.total = 0
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.cancel = threading.Event()
+        self.future: Optional[Future] = None
+        self.submitted = time.time()
+        self.finished: Optional[float] = None
+
+    def report(self, done: int, total: int) -> None:
+        """Records how much of the operation is complete"""
+
+        self.done = done
+        self.total = total
+
+    def request_cancel(self) -> None:
+        """Asks the operation to stop, or drops it if it did not start"""
+
+        self.cancel.set()
+
+        if self.future is not None and self.future.cancel():
+            self.state = "cancelled"
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """Part of the operation complete, when it is known"""
+
+        if self.state == "done":
+            return 1.0
+
+        return self.done / self.total if self.total else None
+
+    @property
+    def active(self) -> bool:
+        """Checks if the operation is waiting or running"""
+
+        return self.state in ("pending", "running")
+
+
+class Jobs:
+    """Pool of threads running jobs, queuing the finished ones for the interface"""
+
+    def __init__(self, workers: int = WORKERS) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="job"
+        )
+        self.jobs: List[Job] = list()
+        self.finished: "queue.Queue[Job]" = queue.Queue()
+        self.lock = threading.Lock()
+
+    def submit(self, name: str, function: Callable[..., Any], *args, **kwargs) -> Job:
+        """Runs a function in the background, returning its handle
+
+        The function receives the progress and cancel arguments of the job
+        when it accepts them.
+        """
+
+        job = Job(name)
+        parameters = inspect.signature(function).parameters
+
+        if "progress" in parameters:
+            kwargs.setdefault("progress", job.report)
+        if "cancel" in parameters:
+            kwargs.setdefault("cancel", job.cancel)
+
+        with self.lock:
+            self.jobs.append(job)
+
+        job.future = self.executor.submit(self.__run, job, function, args, kwargs)
+        job.future.add_done_callback(lambda future: self.__settle(job, future))
+
+        return job
+
+    def list(self) -> List[Job]:
+        """Returns the jobs running and the ones that finished recently"""
+
+        with self.lock:
+            return list(self.jobs)
+
+    def poll(self) -> List[Job]:
+        """Returns the jobs that finished since the last call"""
+
+        finished: List[Job] = list()
+
+        while True:
+            try:
+                finished.append(self.finished.get_nowait())
+            except queue.Empty:
+                break
+
+        with self.lock:
+            ended = [job for job in self.jobs if not job.active]
+            for job in ended[: max(0, len(ended) - HISTORY)]:
+                self.jobs.remove(job)
+
+        return finished
+
+    def shutdown(self) -> None:
+        """Cancels every job and waits for the running ones to stop"""
+
+        for job in self.list():
+            job.request_cancel()
+
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def __run(
+        job: Job, function: Callable[..., Any], args: tuple, kwargs: dict
+    ) -> None:
+        """Runs the operation of a job on a worker, recording its outcome"""
+
+        job.state = "running"
+
+        try:
+            job.result = function(*args, **kwargs)
+            job.state = "done"
+        except TransferCancelled:
+            job.state = "cancelled"
+        except BaseException as error:
+            job.error = error
+            job.state = "failed"
+
+    def __settle(self, job: Job, future: Future) -> None:
+        """Queues a job once it ended, including when it never started"""
+
+        if future.cancelled():
+            job.state = "cancelled"
+
+        job.finished = time.time()
+        self.finished.put(job)
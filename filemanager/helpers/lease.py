@@ -0,0 +1,106 @@
+"""Advisory locks that keep a file for one process while it is being changed"""
+
+import os
+import socket
+import threading
+from typing import BinaryIO, List, Optional, Set
+
+from . import util
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# Every file is one byte of this file, locked at the offset of its identifier
+LOCKS = util.DATABASE.with_name(".leases")
+
+_lock = threading.Lock()
+_held: Set[int] = set()
+_stream: Optional[BinaryIO] = None
+
+
+def acquire(keys: List[int]) -> List[int]:
+    """Locks every key or none of them, returns the keys held by others
+
+    The system releases the locks of a process when it ends, so a crashed
+    process never keeps a file locked.
+    """
+
+    with _lock:
+        if _held.intersection(keys):
+            return sorted(_held.intersection(keys))
+
+        taken: List[int] = list()
+
+        for key in sorted(set(keys)):
+            if not __lock(key):
+                for locked in taken:
+                    __unlock(locked)
+                return [key]
+            taken.append(key)
+
+        _held.update(taken)
+
+    return list()
+
+
+def release(keys: List[int]) -> None:
+    """Unlocks keys previously acquired by this process"""
+
+    with _lock:
+        for key in set(keys).intersection(_held):
+            __unlock(key)
+            _held.discard(key)
+
+
+def owner() -> str:
+    """Identifies this process among the ones sharing the database"""
+
+    return f"{host()}:{os.getpid()}"
+
+
+def host() -> str:
+    """Identifies the machine whose processes share these locks"""
+
+    return socket.gethostname()
+
+
+def __descriptor() -> int:
+    """Returns the file holding the locks, kept open while the process lives
+
+    Closing any descriptor of a file drops every lock the process holds on it,
+    so a single one is shared.
+    """
+
+    global _stream
+
+    if _stream is None:
+        _stream = open(LOCKS, "a+b")
+
+    return _stream.fileno()
+
+
+def __lock(key: int) -> bool:
+    """Tries to lock the byte of a key without waiting"""
+
+    try:
+        if os.name == "nt":
+            os.lseek(__descriptor(), key, os.SEEK_SET)
+            msvcrt.locking(__descriptor(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.lockf(__descriptor(), fcntl.LOCK_EX | fcntl.LOCK_NB, 1, key)
+    except OSError:
+        return False
+
+    return True
+
+
+def __unlock(key: int) -> None:
+    """Unlocks the byte of a key"""
+
+    if os.name == "nt":
+        os.lseek(__descriptor(), key, os.SEEK_SET)
+        msvcrt.locking(__descriptor(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.lockf(__descriptor(), fcntl.LOCK_UN, 1, key)
@@ -0,0 +1,224 @@
+"""Copy and reading of file contents in chunks, avoiding Python buffers if possible"""
+
+import errno
+import hashlib
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional, Set, Tuple
+
+from ..models.exceptions import TransferCancelled
+
+CHUNK = 8 * 1024 * 1024
+HASH_CHUNK = 1024 * 1024
+
+# Errors meaning the kernel cannot copy between these files, not that it failed
+UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+}
+
+Progress = Callable[[int, int], None]
+
+
+class TransferBatch:
+    """Groups copies so their data and directories are synchronised once"""
+
+    def __init__(self, fsync: bool = True) -> None:
+        self.fsync = fsync
+        self.pending: List[Tuple[Path, Path, Optional[int]]] = list()
+
+    def __enter__(self) -> "TransferBatch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def add(self, temporary: Path, destination: Path, mode: Optional[int]) -> None:
+        """Keeps a written copy to be published when the batch is committed"""
+
+        self.pending.append((temporary, destination, mode))
+
+    def commit(self) -> None:
+        """Flushes every copy to disk and moves it to its destination"""
+
+        directories: Set[Path] = set()
+
+        for temporary, destination, mode in self.pending:
+            if self.fsync:
+                self.__sync_file(temporary)
+            if mode is not None:
+                os.chmod(temporary, mode)
+            os.replace(temporary, destination)
+            directories.add(destination.parent)
+
+        if self.fsync:
+            for directory in directories:
+                self.__sync_directory(directory)
+
+        self.pending.clear()
+
+    def discard(self) -> None:
+        """Deletes the copies that were not published"""
+
+        for temporary, _, _ in self.pending:
+            temporary.unlink(missing_ok=True)
+
+        self.pending.clear()
+
+    @staticmethod
+    def __sync_file(path: Path) -> None:
+        """Forces the content of a file to disk"""
+
+        with open(path, "rb+") as stream:
+            os.fsync(stream.fileno())
+
+    @staticmethod
+    def __sync_directory(path: Path) -> None:
+        """Forces the entries of a directory to disk, where the system allows it"""
+
+        if os.name != "posix":
+            return None
+
+        descriptor = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+
+def copy(
+    source: Path,
+    destination: Path,
+    progress: Optional[Progress] = None,
+    cancel: Optional[threading.Event] = None,
+    mode: Optional[int] = None,
+    batch: Optional[TransferBatch] = None,
+) -> int:
+    """Copies a file through a temporary name, returning the bytes copied
+
+    The destination only appears once complete: at the end of the copy or,
+    when a batch is received, when the batch is committed.
+    """
+
+    temporary = destination.with_name(
+        f".{destination.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+
+    try:
+        with open(source, "rb") as reader:
+            with open(temporary, "wb", buffering=0) as writer:
+                total = os.fstat(reader.fileno()).st_size
+                copied = __copy_stream(
+                    reader.fileno(), writer.fileno(), total, progress, cancel
+                )
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+
+    if batch is None:
+        batch = TransferBatch(fsync=False)
+        batch.add(temporary, destination, mode)
+        batch.commit()
+    else:
+        batch.add(temporary, destination, mode)
+
+    return copied
+
+
+def digest(path: Path) -> str:
+    """Computes the digest of the content of a file, reading it in chunks"""
+
+    hasher = hashlib.sha256()
+
+    with open(path, "rb") as stream:
+        for chunk in iter(lambda: stream.read(HASH_CHUNK), b""):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def __copy_stream(
+    reader: int,
+    writer: int,
+    total: int,
+    progress: Optional[Progress],
+    cancel: Optional[threading.Event],
+) -> int:
+    """Moves the bytes with the fastest method the system supports
+
+    A method that stops short of the size of the source hands over to the
+    next one, and a copy that still ends with another size is an error.
+    """
+
+    copied = 0
+    methods = [__copy_file_range, __sendfile, __read_write]
+
+    while True:
+        if cancel is not None and cancel.is_set():
+            raise TransferCancelled("The transfer was cancelled")
+
+        try:
+            sent = methods[0](reader, writer, copied)
+        except OSError as error:
+            if error.errno not in UNSUPPORTED or len(methods) == 1:
+                raise
+            methods.pop(0)
+            continue
+
+        if not sent:
+            # Some file systems answer 0 before the end, the next method decides
+            if copied < total and len(methods) > 1:
+                methods.pop(0)
+                continue
+            break
+
+        copied += sent
+        if progress is not None:
+            progress(copied, total)
+
+    if copied != total:
+        raise OSError(errno.EIO, f"Copied {copied} of {total} bytes")
+
+    return copied
+
+
+def __copy_file_range(reader: int, writer: int, offset: int) -> int:
+    """Copies a chunk inside the kernel, sharing blocks where possible"""
+
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range is not available")
+
+    return os.copy_file_range(reader, writer, CHUNK, offset, offset)
+
+
+def __sendfile(reader: int, writer: int, offset: int) -> int:
+    """Copies a chunk inside the kernel from one file to another"""
+
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.ENOSYS, "sendfile between files is not available")
+
+    os.lseek(writer, offset, os.SEEK_SET)
+    return os.sendfile(writer, reader, offset, CHUNK)
+
+
+def __read_write(reader: int, writer: int, offset: int) -> int:
+    """Copies a chunk through user space, for systems without the others"""
+
+    os.lseek(reader, offset, os.SEEK_SET)
+    os.lseek(writer, offset, os.SEEK_SET)
+
+    data = os.read(reader, CHUNK)
+    view = memoryview(data)
+
+    while view:
+        view = view[os.write(writer, view) :]
+
+    return len(data)
@@ -3,22 +3,38 @@
 import os
 import re
 import shutil
+import stat
 import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Optional, Tuple
-
-import pendulum
+from typing import Callable, Dict, List, Optional, Tuple
 
 from ..models.entities import File
-from ..models.exceptions import FileAlreadyUsed, FileNotFound, FileNotValid
+from ..models.exceptions import FileNotFound, FileNotValid, TransferCancelled
+from . import archive, backup, transfer
 
 DATABASE = Path.cwd() / "filemanager" / "database" / "documents.db"
 STORAGE = Path.cwd() / "filemanager" / "database" / ".storage"
+OPENED = Path.cwd() / "filemanager" / "database" / ".opened"
+RESET_JOURNAL = Path.cwd() / "filemanager" / "database" / ".reset"
+
+# Stored contents live in STORAGE/<first characters of the digest>/<digest>
+SHARD_LEVELS = 1
+SHARD_WIDTH = 2
+SHARD_BATCH = 500
+
+DIGEST = re.compile(r"[0-9a-f]{64}")
 
 
 def expired_file(file: File) -> bool:
     """Check if a file is expired"""
 
+    if file.expired is not None:
+        return file.expired
+
     if not file.expiration:
         return False
 
@@ -28,6 +44,8 @@ def expired_file(file: File) -> bool:
     month = int(date[1])
     day = int(date[2])
 
+    import pendulum
+
     expiration_date = pendulum.datetime(year, month, day)
     actual_date = pendulum.now()
     return expiration_date <= actual_date
@@ -51,6 +69,8 @@ def replace_text(text: str) -> str:
 def generate_dates() -> Tuple[List[str], List[str], List[str]]:
     """Sets valid options as expiry dates"""
 
+    import pendulum
+
     init_year = pendulum.now().year
 
     year = [str(i) for i in range(init_year, init_year + 11)]
@@ -71,26 +91,6 @@ def limit_text(text: str) -> str:
     return text
 
 
-def file_used(file_: File) -> None:
-    """Displays an error message if the file is in use"""
-
-    file_dict = file_._asdict()
-
-    values = decompose_file(f"{file_.path}")
-    file_dict["description"] = values[0]
-    file_dict["extension"] = values[1]
-
-    file = format_file(File(**file_dict))
-
-    try:
-        rename_file(file)
-
-    except:
-        raise FileAlreadyUsed(
-            f"The file '{file.path}' is being used by another process."
-        )
-
-
 def validate_file(file: File) -> None:
     "Displays an error message if the data content of the file is invalid"
 
@@ -108,8 +108,14 @@ def validate_file(file: File) -> None:
     if not isinstance(file.extension, str) or not file.extension:
         raise FileNotValid(f"The extension '{file.extension}' is not valid")
 
-    if not __valid_date(file.expiration):
-        raise FileNotValid(f"The expiration '{file.expiration}' is not valid")
+    validate_expiration(file.expiration)
+
+
+def validate_expiration(expiration: Optional[str]) -> None:
+    """Displays an error message if the expiration date is invalid"""
+
+    if not __valid_date(expiration):
+        raise FileNotValid(f"The expiration '{expiration}' is not valid")
 
 
 def format_file(file: File) -> File:
@@ -126,67 +132,509 @@ def format_file(file: File) -> File:
     return File(**file_dict)
 
 
-def copy_file(file: File) -> None:
-    """Copy a file with a new name"""
+def blob_path(digest: str) -> Path:
+    """Location in the local storage of the content with the digest received"""
+
+    path = __shard_path(digest)
+
+    # Contents stored before the sharded layout stay flat until shard_storage
+    if not path.exists() and (STORAGE / digest).exists():
+        return STORAGE / digest
+
+    return path
+
+
+def shard_storage(limit: int = SHARD_BATCH) -> int:
+    """Moves a batch of contents from the flat layout to their shard
+
+    Each move is an atomic rename, so the storage remains usable meanwhile;
+    returns how many contents were moved, zero once the storage is sharded.
+    """
+
+    moved = 0
+
+    with os.scandir(STORAGE) as entries:
+        for entry in entries:
+            if moved >= limit:
+                break
+
+            if entry.is_file() and DIGEST.fullmatch(entry.name):
+                destination = __shard_path(entry.name)
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(entry.path, destination)
+                moved += 1
+
+    return moved
+
+
+def scan_storage(workers: int = backup.WORKERS) -> Dict[str, os.stat_result]:
+    """Returns the status of every file of the local storage by relative path
+
+    The flat level is read first, then every shard directory in parallel.
+    """
+
+    found: Dict[str, os.stat_result] = dict()
+    shards: List[Path] = list()
+
+    with os.scandir(STORAGE) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shards.append(Path(entry.path))
+            elif entry.is_file(follow_symlinks=False):
+                found[entry.name] = entry.stat(follow_symlinks=False)
+
+    def read_shard(shard: Path) -> List[Tuple[str, os.stat_result]]:
+        return [
+            (f"{shard.name}/{relative}", status)
+            for relative, status in backup.walk(shard)
+        ]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for files in executor.map(read_shard, shards):
+            found.update(files)
+
+    return found
+
+
+def verify_content(digest: str) -> bool:
+    """Checks that a stored content still hashes to its digest"""
+
+    try:
+        return transfer.digest(blob_path(digest)) == digest
+    except OSError:
+        return False
+
+
+def duplicate_stored(relative: str, copy: str) -> None:
+    """Gives a file of the local storage a second name, sharing its content"""
+
+    source = STORAGE / relative
+    target = STORAGE / copy
+
+    if not source.exists() or target.exists():
+        return None
+
+    try:
+        os.link(source, target)
+    except OSError:
+        transfer.copy(source, target)
+
+
+def discard_stored(relative: str) -> None:
+    """Deletes a file of the local storage that nothing refers to"""
+
+    path = STORAGE / relative
+    if path.exists():
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+        path.unlink()
+
+
+def copy_file(
+    file: File,
+    progress: Optional[transfer.Progress] = None,
+    cancel: Optional[threading.Event] = None,
+) -> File:
+    """Stores the content of a file once, returns the file with its digest"""
+
+    hashed = digest_file(file)
+    store_content(hashed, progress, cancel)
+
+    return hashed
+
+
+def digest_file(file: File) -> File:
+    """Returns the file with the digest of its content, without storing it"""
+
+    return file._replace(digest=transfer.digest(Path(f"{file.path}")))
+
+
+def store_content(
+    file: File,
+    progress: Optional[transfer.Progress] = None,
+    cancel: Optional[threading.Event] = None,
+) -> None:
+    """Copies the content of a file already hashed, unless it is stored"""
+
+    destination = blob_path(f"{file.digest}")
+
+    if not destination.exists():
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        transfer.copy(
+            Path(f"{file.path}"), destination, progress, cancel, mode=stat.S_IREAD
+        )
+        os.system(f"attrib +h +s {destination}")
+
+
+def adopt_file(source: Path) -> str:
+    """Links an existing file of the local storage to its content address"""
+
+    digest = transfer.digest(source)
+    destination = blob_path(digest)
+
+    if not destination.exists():
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        temporary = __temporary_path(destination)
+        try:
+            os.link(source, temporary)
+            os.replace(temporary, destination)
+        except OSError:
+            transfer.copy(source, destination)
+
+    return digest
+
+
+def retire_file(source: Path, digest: str) -> None:
+    """Removes an adopted file once its content address is in use"""
 
-    source = Path(f"{file.path}")
-    destination = STORAGE / f"{file.description}.{file.extension}"
+    if source.exists():
+        source.unlink()
 
-    shutil.copy(source, destination)
-    os.system(f"attrib +h +s {destination}")
+    os.chmod(blob_path(digest), stat.S_IREAD)
+    os.system(f"attrib +h +s {blob_path(digest)}")
+
+
+def stored_size(file: File) -> int:
+    """Returns the size in bytes of the stored content of a file"""
+
+    return blob_path(f"{file.digest}").stat().st_size
 
 
 def open_file(file: File) -> None:
-    """Finds a file in the local storage and opens it"""
+    """Opens a writable copy of a stored file under its description
+
+    The stored content may be shared by several files, so it is never handed
+    out. Each copy lives in a folder named by the id of its file, next to the
+    digest it was made from, so the controller can bring back the edits.
+    """
+
+    path = opened_path(file)
+    copy = opened_copy(file)
+
+    if copy is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rebase_opened(file, f"{file.digest}")
+        transfer.copy(blob_path(f"{file.digest}"), path)
+    elif copy != path and not rename_opened(file):
+        # A program still holds the copy under the description it had
+        path = copy
 
-    path = STORAGE / f"{file.description}.{file.extension}"
     subprocess.Popen([path], shell=True)
 
 
-def rename_file(file: File) -> None:
-    """Changes the name of a file"""
+def opened_path(file: File) -> Path:
+    """Location of the copy a file is opened from"""
+
+    name = f"{file.description}.{f'{file.extension}'.lower()}"
+
+    return __opened_folder(file) / name
+
+
+def opened_copy(file: File) -> Optional[Path]:
+    """Returns the copy opened before for a file, whatever its name, if any"""
+
+    folder = __opened_folder(file)
+    if not folder.is_dir():
+        return None
+
+    copies = [path for path in folder.iterdir() if not path.name.startswith(".")]
+
+    return copies[0] if copies else None
+
+
+def opened_base(file: File) -> Optional[str]:
+    """Returns the digest of the content the opened copy of a file was made from"""
+
+    try:
+        return (__opened_folder(file) / ".base").read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+def rebase_opened(file: File, digest: str) -> None:
+    """Records the content the opened copy of a file now starts from"""
+
+    (__opened_folder(file) / ".base").write_text(digest, encoding="utf-8")
+
+
+def rename_opened(file: File) -> bool:
+    """Gives the opened copy of a file its current name, False if it is held"""
+
+    copy = opened_copy(file)
+    if copy is None or copy == opened_path(file):
+        return True
+
+    try:
+        os.replace(copy, opened_path(file))
+    except OSError:
+        return False
+
+    return True
+
+
+def opened_ids() -> List[int]:
+    """Returns the ids of the files with copies opened before"""
+
+    if not OPENED.is_dir():
+        return list()
+
+    return sorted(int(path.name) for path in OPENED.iterdir() if path.name.isdigit())
 
-    path = STORAGE / f"{file.path}"
-    path.rename(path.with_name(f"{file.description}.{file.extension}"))
+
+def discard_opened(file: File) -> bool:
+    """Deletes the opened copy of a file, returns False if a program holds it"""
+
+    try:
+        shutil.rmtree(__opened_folder(file))
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return False
+
+    return True
+
+
+def discard_legacy_opened() -> None:
+    """Deletes the copies opened by earlier versions that are links to contents
+
+    Those linked the stored content itself under the description, so the link
+    is removed and the content protected again. Copies that are not links may
+    hold edits that cannot be attributed to a file and are left in place.
+    """
+
+    if not OPENED.is_dir():
+        return None
+
+    for path in OPENED.iterdir():
+        try:
+            if not path.is_file() or path.stat().st_nlink < 2:
+                continue
+
+            digest = transfer.digest(path)
+            os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+            path.unlink()
+            if blob_path(digest).exists():
+                os.chmod(blob_path(digest), stat.S_IREAD)
+        except OSError:
+            continue
 
 
 def delete_file(file: File) -> None:
-    """Deletes a file from the database and local storage"""
+    """Deletes the stored content of a file from the local storage"""
 
-    path = STORAGE / f"{file.description}.{file.extension}"
+    path = blob_path(f"{file.digest}")
     if path.exists():
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
         path.unlink()
 
 
-def generate_backup(file: File) -> None:
+def set_aside(digests: List[str]) -> List[Path]:
+    """Moves stored contents to temporary names, all of them or none
+
+    A content held open by another program cannot be moved on every system,
+    so the contents already moved go back and the error is raised.
+    """
+
+    return __move_aside([blob_path(digest) for digest in digests])
+
+
+def set_aside_opened(files: List[File]) -> List[Path]:
+    """Moves the opened copies of files to temporary names, all of them or none"""
+
+    return __move_aside([__opened_folder(file) for file in files])
+
+
+def put_back(moved: List[Path]) -> None:
+    """Returns the contents set aside to their names"""
+
+    for aside in moved:
+        os.replace(aside, aside.with_name(aside.name[1 : -len(".deleted")]))
+
+
+def discard_aside(moved: List[Path], workers: int = backup.WORKERS) -> None:
+    """Deletes the contents set aside, leaving any that cannot be deleted yet"""
+
+    def discard(path: Path) -> None:
+        try:
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+                path.unlink()
+        except OSError:
+            pass
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(discard, moved))
+
+
+def delete_files(files: List[File], workers: int = backup.WORKERS) -> None:
+    """Deletes the stored contents of several files at once"""
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(delete_file, files))
+
+
+def export_files(
+    files: List[File],
+    file: File,
+    progress: Optional[transfer.Progress] = None,
+    cancel: Optional[threading.Event] = None,
+    workers: int = backup.WORKERS,
+) -> None:
+    """Copies the stored contents of files into a folder, named by description
+
+    The copies are made in parallel and only appear in the folder once every
+    one of them is complete.
+    """
+
+    destination = Path(f"{file.path}")
+    destination.mkdir(parents=True, exist_ok=True)
+    done = 0
+
+    def export(exported: File) -> None:
+        if cancel is not None and cancel.is_set():
+            raise TransferCancelled("The export was cancelled")
+
+        name = f"{exported.description}.{f'{exported.extension}'.lower()}"
+        transfer.copy(blob_path(f"{exported.digest}"), destination / name, batch=batch)
+
+    with transfer.TransferBatch() as batch:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(export, file) for file in files]
+
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    done += 1
+                    if progress is not None:
+                        progress(done, len(files))
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+
+def generate_backup(
+    file: File,
+    database: Path,
+    progress: Optional[transfer.Progress] = None,
+    cancel: Optional[threading.Event] = None,
+) -> None:
     """Creates and classifies the backup of files in the local storage"""
 
-    if not any(STORAGE.iterdir()):
+    if not __has_stored_files():
+        raise FileNotFound("No stored files found")
+
+    backups = Path(f"{file.path}") / "Backups"
+    destiny = backup.unfinished(backups)
+
+    if destiny is None:
+        date = __format_date("Y_M_D")
+        destiny = __folder_name(backups / date)
+        destiny.mkdir(parents=True)
+
+    backup.snapshot(
+        STORAGE,
+        destiny,
+        backup.latest(backups),
+        database,
+        cancel=cancel,
+        progress=progress,
+    )
+
+
+def restore_backup(file: File) -> None:
+    """Replaces the local storage and the database with those of a backup"""
+
+    staging = DATABASE.with_name(".restoring")
+    backup.restore(Path(f"{file.path}"), staging)
+    __install(staging)
+
+
+def generate_archive(
+    file: File, database: Path, cancel: Optional[threading.Event] = None
+) -> None:
+    """Creates a single compressed file with the local storage and the database"""
+
+    if not __has_stored_files():
         raise FileNotFound("No stored files found")
 
     date = __format_date("Y_M_D")
-    source = STORAGE
     destiny = __folder_name(Path(f"{file.path}") / "Backups" / date)
+    destiny.parent.mkdir(parents=True, exist_ok=True)
+
+    archive.write_archive(
+        destiny.with_name(f"{destiny.name}{archive.SUFFIX}"),
+        [(STORAGE, STORAGE.name), (database, DATABASE.name)],
+        cancel,
+    )
+
 
-    shutil.copytree(source, destiny)
+def restore_archive(file: File) -> None:
+    """Replaces the local storage and the database with those of an archive"""
+
+    staging = DATABASE.with_name(".restoring")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    try:
+        archive.read_archive(Path(f"{file.path}"), staging)
+        __install(staging)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
 
 
 def reset_database() -> None:
-    """Delete the database and storage to create them again"""
+    """Delete the database and storage to create them again
 
-    if DATABASE.exists():
-        DATABASE.unlink()
+    The current ones are moved aside at once and deleted in the background, a
+    journal allows recover_reset to finish or undo a reset that was cut short.
+    """
 
-    if STORAGE.exists():
-        for file in STORAGE.iterdir():
-            file.unlink()
-        STORAGE.rmdir()
+    trash = DATABASE.with_name(f".trash-{time.time_ns()}")
+    trash.mkdir()
+
+    __write_reset_journal(trash, "moving")
+
+    for path in (DATABASE, *__database_journals(), STORAGE):
+        if path.exists():
+            os.replace(path, trash / path.name)
+
+    __write_reset_journal(trash, "creating")
 
     DATABASE.touch()
     STORAGE.mkdir(parents=True, exist_ok=True)
-
     os.system(f"attrib +h +s {STORAGE}")
 
+    RESET_JOURNAL.unlink()
+    __reclaim_trash()
+
+    # The opened copies belonged to the files that were just deleted
+    for id in opened_ids():
+        discard_opened(File(id=id))
+
+
+def recover_reset() -> None:
+    """Completes or reverts a reset interrupted by a crash, then reclaims space"""
+
+    if RESET_JOURNAL.exists():
+        trash_name, phase = RESET_JOURNAL.read_text(encoding="utf-8").split()
+        trash = DATABASE.with_name(trash_name)
+
+        if phase == "moving":
+            # Nothing new was created yet: put back what had been moved aside
+            for path in (DATABASE, *__database_journals(), STORAGE):
+                moved = trash / path.name
+                if moved.exists() and not path.exists():
+                    os.replace(moved, path)
+        else:
+            DATABASE.touch()
+            STORAGE.mkdir(parents=True, exist_ok=True)
+
+        RESET_JOURNAL.unlink()
+
+    __reclaim_trash()
+
 
 def __valid_text(text: Optional[str]) -> bool:
     """Checks if the text complies with the parameters"""
@@ -215,17 +663,134 @@ def __valid_date(date_: Optional[str]) -> bool:
 def __format_date(format: str) -> str:
     """Returns the current date in the format received"""
 
+    import pendulum
+
     dt = pendulum.now()
     return dt.format(format)
 
 
+def __install(staging: Path) -> None:
+    """Puts in place the storage and database restored in a folder"""
+
+    storage = staging / STORAGE.name
+    database = staging / DATABASE.name
+
+    if not storage.is_dir() or not database.is_file():
+        raise FileNotValid("The backup does not contain a storage and a database")
+
+    reset_database()
+    STORAGE.rmdir()
+    DATABASE.unlink()
+
+    os.replace(storage, STORAGE)
+    os.replace(database, DATABASE)
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def __write_reset_journal(trash: Path, phase: str) -> None:
+    """Records the progress of a reset, durably, before the next step"""
+
+    with open(RESET_JOURNAL, "w", encoding="utf-8") as journal:
+        journal.write(f"{trash.name} {phase}")
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def __reclaim_trash() -> None:
+    """Deletes, in a background thread, what previous resets moved aside"""
+
+    trash = list(DATABASE.parent.glob(".trash-*"))
+
+    if trash:
+        thread = threading.Thread(target=__delete_trash, args=(trash,), daemon=True)
+        thread.start()
+
+
+def __delete_trash(trash: List[Path]) -> None:
+    """Deletes folders moved aside, including the read-only stored contents"""
+
+    def force(function: Callable[[str], None], path: str, _: object) -> None:
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+        function(path)
+
+    for path in trash:
+        try:
+            # onerror is deprecated since Python 3.12, which passes the exception
+            if sys.version_info >= (3, 12):
+                shutil.rmtree(path, onexc=force)
+            else:
+                shutil.rmtree(path, onerror=force)
+        except OSError:
+            # Another reset may be reclaiming it, or it is retried on the next start
+            pass
+
+
+def __move_aside(paths: List[Path]) -> List[Path]:
+    """Renames files or folders to temporary names, putting them back on error"""
+
+    moved: List[Path] = list()
+
+    for path in paths:
+        if not path.exists():
+            continue
+
+        aside = path.with_name(f".{path.name}.deleted")
+        try:
+            os.replace(path, aside)
+        except OSError:
+            put_back(moved)
+            raise
+        moved.append(aside)
+
+    return moved
+
+
+def __opened_folder(file: File) -> Path:
+    """Folder of the copy a file is opened from, named by the id of the file"""
+
+    return OPENED / f"{file.id}"
+
+
+def __has_stored_files() -> bool:
+    """Checks if the local storage holds at least one content"""
+
+    return next(backup.walk(STORAGE), None) is not None
+
+
+def __shard_path(digest: str) -> Path:
+    """Location of a content in the sharded layout of the local storage"""
+
+    shards = [
+        digest[level * SHARD_WIDTH : (level + 1) * SHARD_WIDTH]
+        for level in range(SHARD_LEVELS)
+    ]
+    return STORAGE.joinpath(*shards, digest)
+
+
+def __database_journals() -> Tuple[Path, Path]:
+    """Returns the write-ahead log files that accompany the database"""
+
+    return (
+        DATABASE.with_name(f"{DATABASE.name}-wal"),
+        DATABASE.with_name(f"{DATABASE.name}-shm"),
+    )
+
+
+def __temporary_path(destination: Path) -> Path:
+    """Name where a content is written before being moved to its address"""
+
+    return destination.with_name(
+        f".{destination.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+
+
 def __folder_name(path: Path) -> Path:
     """Sets the name of the directory"""
 
     count = 1
     new_path = path / str(count)
 
-    while new_path.exists():
+    while new_path.exists() or path.joinpath(f"{count}{archive.SUFFIX}").exists():
         count += 1
         new_path = path / str(count)
 
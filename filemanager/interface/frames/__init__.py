@@ -1,4 +1,5 @@
 """Raise the path of frames"""
 
 from .data_table import DataTable
+from .job_panel import JobPanel
 from .options_bar import OptionsBar
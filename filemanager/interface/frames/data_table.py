@@ -1,20 +1,27 @@
 """Internal frame, grandson of root"""
 
+import tkinter
 from tkinter import ttk
 
 import customtkinter as ctk
-from filemanager.controller import file_controller
 
 from .. import functions
+from ..virtual_table import VirtualTable
 
 
 class DataTable(ctk.CTkFrame):
     """Definition of the elements related to the file table section"""
 
-    def __init__(self, parent: ctk.CTkFrame) -> None:
+    def __init__(self, parent: ctk.CTkFrame, virtual: bool = True) -> None:
         super().__init__(parent)
 
-        self.table = ttk.Treeview(self, selectmode="browse")
+        self.table: ttk.Treeview
+
+        if virtual:
+            self.table = VirtualTable(self, selectmode="extended")
+            self.table.render_row = functions.insert_row
+        else:
+            self.table = ttk.Treeview(self, selectmode="extended")
         self.table.grid(row=0, column=0, sticky="nsew")
 
         self.table_style = ttk.Style()
@@ -48,7 +55,7 @@ class DataTable(ctk.CTkFrame):
         self.table.tag_configure("gray", background="#E26D5C")
         self.table.tag_configure("red", background="#E0E1DD")
 
-        functions.update_table(self.table, file_controller.lists())
+        functions.load_table(self.table)
 
         # Scrolls
         self.scroll_x = ctk.CTkScrollbar(
@@ -59,6 +66,45 @@ class DataTable(ctk.CTkFrame):
         self.scroll_y = ctk.CTkScrollbar(self, command=self.table.yview)
         self.scroll_y.grid(row=0, column=1, sticky="nse")
 
-        self.table.configure(
-            xscrollcommand=self.scroll_x.set, yscrollcommand=self.scroll_y.set
+        if isinstance(self.table, VirtualTable):
+            # The rows in the Treeview are only the ones in sight
+            self.table.configure(xscrollcommand=self.scroll_x.set)
+            self.table.scrolled = self.scroll_y.set
+        else:
+            self.table.configure(
+                xscrollcommand=self.scroll_x.set, yscrollcommand=self.scroll_y.set
+            )
+
+        # Actions on the selected rows
+        root = self.winfo_toplevel()
+
+        self.menu = tkinter.Menu(self, tearoff=0)
+        self.menu.add_command(
+            label="Open", command=lambda: functions.window_open(self.table, root)
+        )
+        self.menu.add_command(
+            label="Edit", command=lambda: functions.window_edit(self.table, root)
+        )
+        self.menu.add_command(
+            label="Delete", command=lambda: functions.window_delete(self.table, root)
         )
+        self.menu.add_command(
+            label="Export to folder...",
+            command=lambda: functions.window_export(self.table, root),
+        )
+
+        # Binds
+        self.table.bind("<Button-3>", self.show_menu)
+        self.table.bind("<Delete>", lambda e: functions.window_delete(self.table, root))
+
+    def show_menu(self, event: tkinter.Event) -> None:
+        """Shows the actions at the pointer, selecting its row if it was not"""
+
+        row = self.table.identify_row(event.y)
+
+        if row and row not in self.table.selection():
+            functions.clear_selection(self.table)
+            self.table.selection_set(row)
+            self.table.focus(row)
+
+        self.menu.tk_popup(event.x_root, event.y_root)
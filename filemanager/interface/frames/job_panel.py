@@ -0,0 +1,85 @@
+"""Internal frame, grandson of root"""
+
+from typing import Dict, List
+
+import customtkinter as ctk
+from filemanager.controller import file_controller
+from filemanager.helpers.jobs import Job
+
+from .. import functions
+
+POLL = 200
+
+# Operations listed at once, the most recent ones
+SHOWN = 4
+
+STATES = {
+    "pending": "Waiting",
+    "running": "Running",
+    "done": "Finished",
+    "failed": "Failed",
+    "cancelled": "Cancelled",
+}
+
+
+class JobPanel(ctk.CTkFrame):
+    """Definition of the elements that follow the operations in the background"""
+
+    def __init__(self, parent: ctk.CTkFrame) -> None:
+        super().__init__(parent)
+
+        self.rows: Dict[int, List[ctk.CTkBaseClass]] = dict()
+        self.grid_columnconfigure(0, weight=1)
+
+        self.after(POLL, self.poll)
+
+    def poll(self) -> None:
+        """Handles the finished operations and refreshes the ones listed"""
+
+        for job in file_controller.finished_jobs():
+            functions.finish_job(job)
+
+        jobs = file_controller.jobs()[-SHOWN:]
+        shown = {job.id for job in jobs}
+
+        for id in set(self.rows) - shown:
+            for widget in self.rows.pop(id):
+                widget.destroy()
+
+        for row, job in enumerate(jobs):
+            if job.id not in self.rows:
+                self.rows[job.id] = self.__create_row(job)
+            self.__update_row(row, job)
+
+        if jobs:
+            self.grid()
+        else:
+            self.grid_remove()
+
+        self.after(POLL, self.poll)
+
+    def __create_row(self, job: Job) -> List[ctk.CTkBaseClass]:
+        """Creates the label, progress bar and cancel button of an operation"""
+
+        label = ctk.CTkLabel(self, text=job.name, anchor="w")
+        bar = ctk.CTkProgressBar(self, width=160)
+        button = ctk.CTkButton(
+            self, text="Cancel", width=70, command=job.request_cancel
+        )
+        return [label, bar, button]
+
+    def __update_row(self, row: int, job: Job) -> None:
+        """Shows the state and progress of an operation in its row"""
+
+        label, bar, button = self.rows[job.id]
+        fraction = job.fraction
+
+        label.configure(text=f"{job.name}: {STATES[job.state]}")
+        label.grid(row=row, column=0, sticky="w", padx=10)
+        bar.grid(row=row, column=1, padx=10, pady=2)
+        bar.set(fraction if fraction is not None else 0)
+
+        if job.active:
+            button.grid(row=row, column=2, padx=10, pady=2)
+        else:
+            button.grid_remove()
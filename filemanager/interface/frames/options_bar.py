@@ -36,7 +36,7 @@ class OptionsBar(ctk.CTkFrame):
                 image=functions.new_image("delete"),
                 command=lambda: functions.window_delete(root.data_table.table, root),
             ),
-            ctk.CTkEntry(self, placeholder_text="Search by description..."),
+            ctk.CTkEntry(self, placeholder_text="Search by description or label..."),
             ctk.CTkButton(
                 self,
                 text="",
@@ -47,7 +47,7 @@ class OptionsBar(ctk.CTkFrame):
                 self,
                 text="",
                 image=functions.new_image("backup"),
-                command=functions.generate_backup,
+                command=lambda: functions.window_backup(root.data_table.table, root),
             ),
         )
 
@@ -65,6 +65,12 @@ class OptionsBar(ctk.CTkFrame):
                         root.data_table.table, self.entry_search
                     ),
                 )
+                self.entry_search.bind(
+                    "<KeyRelease>",
+                    lambda e: functions.search_live(
+                        root.data_table.table, self.entry_search
+                    ),
+                )
                 self.entry_search.focus_get()
 
             # Buttons
@@ -1,71 +1,176 @@
-from pathlib import Path
+import queue
+import threading
 from tkinter import filedialog, messagebox, ttk
-from typing import List
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import customtkinter as ctk
-from PIL import Image
 
 from ..controller import file_controller
 from ..helpers import util
-from ..models.entities import File
-from .toplevels import EntryWindow, NotificationWindow
+from ..helpers.archive import SUFFIX
+from ..helpers.jobs import Job
+from ..models.entities import Change, File
+from . import images
+from .model import DatabaseModel, ListModel, insertion_index, sort_key, text_key
+from .search import LiveSearch
+from .toplevels import BackupWindow, EntryWindow, NotificationWindow
+from .virtual_table import VirtualTable
+
+LOAD_POLL = 20
+
+# Number of times each table was filled, so stale background loads stop
+_loads: Dict[str, int] = dict()
+
+# Column and direction each table is sorted by, to place changed rows
+_sorting: Dict[str, Tuple[str, bool]] = dict()
+
+# Search typed for each table, created with the first keystroke
+_searches: Dict[str, LiveSearch] = dict()
+
+# What to do with the result of each background operation once it finishes
+_callbacks: Dict[int, Callable[[Any], Any]] = dict()
 
 
 def new_image(name: str) -> ctk.CTkImage:
     """Automatize image filling"""
 
-    image_path = Path.cwd() / "filemanager" / "static" / "img"
-    return ctk.CTkImage(Image.open(Path(image_path) / f"{name}.png"), size=(30, 30))
+    return images.icon(name)
 
 
 def update_table(table: ttk.Treeview, data: List[File]) -> None:
     """Remove and display the data in a table"""
 
-    for child in table.get_children():
-        table.delete(child)
-
-    for file in data:
-        tag = "gray" if util.expired_file(file) else "red"
-
-        table.insert(
-            parent="",
-            index="end",
-            iid=str(file.id),
-            text="",
-            values=(
-                file.description,
-                file.modification,
-                file.expiration,
-                file.extension,
-                file.label,
-            ),
-            tags=tag,
-        )
+    # Any background load still filling the table is now outdated
+    _loads[str(table)] = _loads.get(str(table), 0) + 1
 
-    for column in table["columns"]:
-        table.heading(column, text=column.capitalize())
+    if isinstance(table, VirtualTable):
+        table.show(ListModel(data))
+    else:
+        for child in table.get_children():
+            table.delete(child)
+
+        for file in data:
+            insert_row(table, file)
 
     sort_column(table, "description")
 
 
+def load_table(table: ttk.Treeview, size: int = file_controller.LOAD_PAGE) -> None:
+    """Displays the first page of files at once and the rest in the background"""
+
+    if str(table) in _searches:
+        _searches[str(table)].clear()
+
+    if isinstance(table, VirtualTable):
+        _loads[str(table)] = _loads.get(str(table), 0) + 1
+        table.show(DatabaseModel())
+        __headings(table, "description", False)
+        return None
+
+    pages = file_controller.pages(size)
+    update_table(table, next(pages, []))
+
+    received: "queue.Queue[Optional[List[File]]]" = queue.Queue()
+    threading.Thread(target=__fetch_pages, args=(pages, received), daemon=True).start()
+    table.after(LOAD_POLL, __append_pages, table, received, _loads[str(table)])
+
+
 def sort_column(table: ttk.Treeview, column_: str, reverse: bool = False) -> None:
     """Sort in ascending or descending order a table according to a column"""
 
-    data = [(table.set(item, column_).lower(), item) for item in table.get_children("")]
+    if isinstance(table, VirtualTable):
+        table.sort(column_, reverse)
+    else:
+        data = [
+            (text_key(column_, table.set(item, column_)), item)
+            for item in table.get_children("")
+        ]
 
-    data.sort(key=lambda e: e[0], reverse=reverse)
+        data.sort(key=lambda e: e[0], reverse=reverse)
 
-    for index, (_, item) in enumerate(data):
-        table.move(item, "", index)
+        for index, (_, item) in enumerate(data):
+            table.move(item, "", index)
 
-    for column in table["columns"]:
-        table.heading(column, text=column.capitalize())
+    __headings(table, column_, reverse)
 
-    reference = "⌄" if reverse else "^"
-    table.heading(
-        column_,
-        text=f"{column_.capitalize()} ({reference})",
-        command=lambda: sort_column(table, column_, not reverse),
+
+def apply_change(table: ttk.Treeview, change: Change) -> None:
+    """Reflects an operation on some files in a table, without reloading it"""
+
+    if str(table) in _searches:
+        _searches[str(table)].clear()
+
+    if isinstance(table, VirtualTable):
+        table.apply(change)
+        return None
+
+    for file in change.files:
+        if table.exists(str(file.id)):
+            table.delete(str(file.id))
+
+    if change.kind == "delete":
+        return None
+
+    column, reverse = _sorting.get(str(table), ("description", False))
+    children = table.get_children()
+
+    for file in change.files:
+        index = insertion_index(
+            lambda position: text_key(column, table.set(children[position], column)),
+            len(children),
+            sort_key(file, column),
+            reverse,
+        )
+        insert_row(table, file, index)
+        children = table.get_children()
+
+
+def run_job(
+    name: str,
+    function: Callable[..., Any],
+    *args: Any,
+    done: Optional[Callable[[Any], Any]] = None,
+    **kwargs: Any,
+) -> Job:
+    """Runs an operation in the background, handing its result to a callback"""
+
+    job = file_controller.submit(function, *args, name=name, **kwargs)
+
+    if done is not None:
+        _callbacks[job.id] = done
+
+    return job
+
+
+def finish_job(job: Job) -> None:
+    """Shows the error of a failed operation or hands over its result"""
+
+    done = _callbacks.pop(job.id, None)
+
+    if job.state == "failed" and job.error is not None:
+        messagebox.showerror(type(job.error).__name__, message=str(job.error))
+    elif job.state == "done" and done is not None:
+        done(job.result)
+
+
+def insert_row(table: ttk.Treeview, file: File, index: Any = "end") -> None:
+    """Adds a file to a table, tagged according to its expiration"""
+
+    tag = "gray" if util.expired_file(file) else "red"
+
+    table.insert(
+        parent="",
+        index=index,
+        iid=str(file.id),
+        text="",
+        values=(
+            file.description,
+            file.modification,
+            file.expiration,
+            file.extension,
+            file.label,
+        ),
+        tags=tag,
     )
 
 
@@ -91,17 +196,21 @@ def window_add(table: ttk.Treeview, root: ctk.CTk) -> None:
     window.description_entry.insert(0, util.replace_text(description))
     window.accept_button.configure(
         command=lambda: [
-            file_controller.create(
-                File(
-                    description=window.description_entry.get(),
-                    extension=extension,
-                    expiration=f"{window.year_combobox.get()}/{window.month_combobox.get()}/{window.day_combobox.get()}",
-                    label=window.label_entry.get(),
-                    path=filename,
+            run_job(
+                "Add file",
+                file_controller.create,
+                __checked(
+                    File(
+                        description=window.description_entry.get(),
+                        extension=extension,
+                        expiration=f"{window.year_combobox.get()}/{window.month_combobox.get()}/{window.day_combobox.get()}",
+                        label=window.label_entry.get(),
+                        path=filename,
+                    ),
                 ),
+                done=lambda change: apply_change(table, change),
             ),
             window.destroy(),
-            update_table(table, file_controller.lists()),
         ]
     )
     root.attributes("-disabled", 1)
@@ -127,7 +236,12 @@ def window_open(table: ttk.Treeview, root: ctk.CTk):
     window.accept_button.configure(
         command=lambda: [
             file_controller.open(
-                File(description=description, extension=extension, path=filename)
+                File(
+                    id=int(selected),
+                    description=description,
+                    extension=extension,
+                    path=filename,
+                )
             ),
             window.destroy(),
         ]
@@ -142,7 +256,10 @@ def window_edit(table: ttk.Treeview, root: ctk.CTk):
     if not table.selection():
         return None
 
-    selected = table.focus()
+    if len(table.selection()) > 1:
+        return __window_edit_many(table, root)
+
+    selected = table.selection()[0]
     values = table.item(selected, "values")
     description = values[0]
     expiration = values[2].split("/")
@@ -165,18 +282,22 @@ def window_edit(table: ttk.Treeview, root: ctk.CTk):
 
     window.accept_button.configure(
         command=lambda: [
-            file_controller.update(
-                File(
-                    id=int(selected),
-                    description=window.description_entry.get(),
-                    expiration=f"{window.year_combobox.get()}/{window.month_combobox.get()}/{window.day_combobox.get()}",
-                    extension=extension,
-                    label=window.label_entry.get(),
-                    path=filename,
-                )
+            run_job(
+                "Edit file",
+                file_controller.update,
+                __checked(
+                    File(
+                        id=int(selected),
+                        description=window.description_entry.get(),
+                        expiration=f"{window.year_combobox.get()}/{window.month_combobox.get()}/{window.day_combobox.get()}",
+                        extension=extension,
+                        label=window.label_entry.get(),
+                        path=filename,
+                    )
+                ),
+                done=lambda change: apply_change(table, change),
             ),
             window.destroy(),
-            update_table(table, file_controller.lists()),
         ]
     )
     root.attributes("-disabled", 1)
@@ -189,34 +310,49 @@ def window_delete(table: ttk.Treeview, root: ctk.CTk):
     if not table.selection():
         return None
 
-    selected = table.focus()
-    values = table.item(selected, "values")
-    description = values[0]
-    extension = values[3]
-    filename = f"{description}.{extension.lower()}"
+    files = __selected_files(table)
+
+    if len(files) == 1:
+        filename = f"{files[0].path}"
+        text = f"Are you sure to delete {util.limit_text(filename)}?"
+    else:
+        text = f"Are you sure to delete {len(files)} files?"
 
     window = NotificationWindow()
     window.title("Delete file")
     window.transient(root)
-    window.label.configure(text=f"Are you sure to delete {util.limit_text(filename)}?")
+    window.label.configure(text=text)
     window.accept_button.configure(
         command=lambda: [
-            file_controller.delete(
-                File(
-                    id=int(selected),
-                    description=description,
-                    extension=extension,
-                    path=filename,
-                )
+            run_job(
+                "Delete file" if len(files) == 1 else f"Delete {len(files)} files",
+                file_controller.delete_many,
+                files,
+                done=lambda change: apply_change(table, change),
             ),
             window.destroy(),
-            update_table(table, file_controller.lists()),
         ]
     )
     root.attributes("-disabled", 1)
     window.bind("<Destroy>", lambda event: root.attributes("-disabled", 0))
 
 
+def window_export(table: ttk.Treeview, root: ctk.CTk):
+    """Request a folder to copy the selected files into"""
+
+    if not table.selection():
+        return None
+
+    files = __selected_files(table)
+    directory = filedialog.askdirectory(parent=root, title="Export to folder")
+
+    if not directory:
+        return None
+
+    name = "Export file" if len(files) == 1 else f"Export {len(files)} files"
+    run_job(name, file_controller.export_many, files, File(path=directory))
+
+
 def switch_appearance():
     """Change the style of the application between ligth and dark mode"""
 
@@ -227,19 +363,77 @@ def switch_appearance():
         ctk.set_appearance_mode("Light")
 
 
-def generate_backup():
-    """Request a route to generate the backup"""
+def window_backup(table: ttk.Treeview, root: ctk.CTk):
+    """Show the window to back up the stored files or restore a backup
+
+    The chosen mode makes a folder snapshot or a single compressed archive,
+    and restores from one or the other.
+    """
+
+    window = BackupWindow()
+    window.title("Backup")
+    window.transient(root)
+    window.backup_button.configure(
+        command=lambda: generate_backup(__archive_chosen(window))
+    )
+    window.restore_button.configure(
+        command=lambda: restore_backup(table, root, __archive_chosen(window))
+    )
+    root.attributes("-disabled", 1)
+    window.bind("<Destroy>", lambda event: root.attributes("-disabled", 0))
+
+
+def generate_backup(archive: bool = False):
+    """Request a route to generate the backup, a folder or a single archive"""
 
     directory = filedialog.askdirectory()
-    file_controller.backup(File(path=directory))
+
+    if not directory:
+        return None
+
+    if archive:
+        run_job("Archive", file_controller.archive, File(path=directory))
+    else:
+        run_job("Backup", file_controller.backup, File(path=directory))
+
+
+def restore_backup(table: ttk.Treeview, root: ctk.CTk, archive: bool = False):
+    """Request a backup folder, Backups/<date>/<number>, or archive to restore"""
+
+    if archive:
+        path = filedialog.askopenfilename(
+            parent=root,
+            title="Restore backup archive",
+            filetypes=[("Backup archive", f"*{SUFFIX}")],
+        )
+    else:
+        path = filedialog.askdirectory(parent=root, title="Restore backup folder")
+
+    if not path:
+        return None
+
+    message = "The stored files will be replaced by the ones of the backup."
+    if not messagebox.askokcancel("Restore backup", message=message, parent=root):
+        return None
+
+    run_job(
+        "Restore",
+        file_controller.restore_archive if archive else file_controller.restore,
+        File(path=path),
+        done=lambda _: load_table(table),
+    )
 
 
 def search_description(table: ttk.Treeview, entry_search: ctk.CTkEntry):
     """Displays the results most similar to the description received"""
 
-    file = File(description=entry_search.get())
-    data_ = file_controller.details(file)
-    update_table(table, data_)
+    __searcher(table).request(entry_search.get(), delay=0)
+
+
+def search_live(table: ttk.Treeview, entry_search: ctk.CTkEntry):
+    """Displays the results of the description while it is being typed"""
+
+    __searcher(table).request(entry_search.get())
 
 
 def clear_selection(table: ttk.Treeview):
@@ -253,3 +447,149 @@ def report_callback_exception(self, exc, val, tb):
     """Show the error notification window"""
 
     messagebox.showerror(type(val).__name__, message=str(val))
+
+
+def __headings(table: ttk.Treeview, column_: str, reverse: bool) -> None:
+    """Marks the column the table is sorted by, offering the opposite order"""
+
+    _sorting[str(table)] = (column_, reverse)
+
+    for column in table["columns"]:
+        table.heading(column, text=column.capitalize())
+
+    reference = "⌄" if reverse else "^"
+    table.heading(
+        column_,
+        text=f"{column_.capitalize()} ({reference})",
+        command=lambda: sort_column(table, column_, not reverse),
+    )
+
+
+def __checked(file: File) -> File:
+    """Validates a file before it is sent, so the window stays open if it fails"""
+
+    util.validate_file(file)
+    return file
+
+
+def __selected_files(table: ttk.Treeview) -> List[File]:
+    """Returns the files of the selected rows, including the ones out of sight"""
+
+    files: List[File] = list()
+
+    for selected in table.selection():
+        values = table.item(selected, "values")
+        files.append(
+            File(
+                id=int(selected),
+                description=values[0],
+                extension=values[3],
+                path=f"{values[0]}.{values[3].lower()}",
+            )
+        )
+
+    return files
+
+
+def __archive_chosen(window: BackupWindow) -> bool:
+    """Closes the backup window, returning whether the archive mode was chosen"""
+
+    archive = window.mode_button.get() == "Archive"
+    window.destroy()
+
+    return archive
+
+
+def __window_edit_many(table: ttk.Treeview, root: ctk.CTk) -> None:
+    """Show the window that changes the label or expiration of several files
+
+    Only the fields whose box is checked change, and left empty they are
+    cleared in every file.
+    """
+
+    files = __selected_files(table)
+
+    window = EntryWindow()
+    window.title(f"Edit {len(files)} files")
+    window.transient(root)
+    window.description_label.configure(text=f"{len(files)} files selected")
+    window.description_entry.grid_remove()
+
+    change_expiration = ctk.CTkCheckBox(window, text="Change expiration")
+    change_label = ctk.CTkCheckBox(window, text="Change label")
+    change_expiration.grid(row=1, column=0, columnspan=3, pady=5)
+    change_label.grid(row=1, column=3, pady=5)
+
+    def accept() -> None:
+        year = window.year_combobox.get()
+        month = window.month_combobox.get()
+        day = window.day_combobox.get()
+        expiration = f"{year}/{month}/{day}"
+        label = window.label_entry.get()
+
+        if change_expiration.get():
+            util.validate_expiration(expiration)
+        else:
+            expiration = file_controller.KEEP
+
+        if not change_label.get():
+            label = file_controller.KEEP
+
+        run_job(
+            f"Edit {len(files)} files",
+            file_controller.update_many,
+            files,
+            label=label,
+            expiration=expiration,
+            done=lambda change: apply_change(table, change),
+        )
+        window.destroy()
+
+    window.accept_button.configure(command=accept)
+    root.attributes("-disabled", 1)
+    window.bind("<Destroy>", lambda event: root.attributes("-disabled", 0))
+
+
+def __searcher(table: ttk.Treeview) -> LiveSearch:
+    """Returns the search that fills a table, creating it if necessary"""
+
+    if str(table) not in _searches:
+        _searches[str(table)] = LiveSearch(
+            table,
+            lambda found: (
+                load_table(table) if found is None else update_table(table, found)
+            ),
+        )
+
+    return _searches[str(table)]
+
+
+def __fetch_pages(pages: Iterator[List[File]], received: queue.Queue) -> None:
+    """Reads the remaining pages away from the interface thread"""
+
+    try:
+        for page in pages:
+            received.put(page)
+    finally:
+        received.put(None)
+
+
+def __append_pages(table: ttk.Treeview, received: queue.Queue, load: int) -> None:
+    """Adds the pages read so far, a few per turn so the window stays responsive"""
+
+    if _loads.get(str(table)) != load or not table.winfo_exists():
+        return None
+
+    for _ in range(5):
+        try:
+            page = received.get_nowait()
+        except queue.Empty:
+            break
+
+        if page is None:
+            return None
+
+        for file in page:
+            insert_row(table, file)
+
+    table.after(LOAD_POLL, __append_pages, table, received, load)
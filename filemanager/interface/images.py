@@ -0,0 +1,55 @@
+"""Images of the interface, decoded once and shared between widgets"""
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Tuple
+
+import customtkinter as ctk
+
+IMAGES = Path.cwd() / "filemanager" / "static" / "img"
+SIZE = (30, 30)
+
+# Images at other sizes are kept for the most recently requested ones only
+CACHE_SIZE = 32
+
+_images: Dict[str, object] = dict()
+_icons: Dict[str, ctk.CTkImage] = dict()
+
+
+def preload() -> None:
+    """Decodes every image of the assets folder at once"""
+
+    from PIL import Image
+
+    for path in sorted(IMAGES.glob("*.png")):
+        image = Image.open(path)
+        image.load()
+        _images[path.stem] = image
+        _icons[path.stem] = ctk.CTkImage(image, size=SIZE)
+
+
+def icon(name: str, size: Tuple[int, int] = SIZE) -> ctk.CTkImage:
+    """Returns the image shared by every widget showing an asset at a size"""
+
+    if not _images:
+        preload()
+
+    if size == SIZE:
+        return _icons[name]
+
+    return __scaled(name, size)
+
+
+def clear() -> None:
+    """Forgets the decoded images, to load them again on next use"""
+
+    _images.clear()
+    _icons.clear()
+    __scaled.cache_clear()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def __scaled(name: str, size: Tuple[int, int]) -> ctk.CTkImage:
+    """Creates the image of an asset at a size that was not preloaded"""
+
+    return ctk.CTkImage(_images[name], size=size)
@@ -0,0 +1,250 @@
+"""Rows shown by the tables, kept apart from the widgets that display them"""
+
+import re
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..controller import file_controller
+from ..models.entities import Change, File
+
+WINDOW = 200
+
+# Windows of rows kept after being read, enough for a few screens each way
+WINDOWS = 16
+
+DATES = ("modification", "expiration")
+DATE = re.compile(r"(\d{4})/(\d{1,2})/(\d{1,2})(?: (\d{1,2}):(\d{2})\s*([AaPp][Mm])?)?")
+
+
+def sort_key(file: File, column: str) -> Any:
+    """Returns the value a row is ordered by for a column"""
+
+    return text_key(column, f"{getattr(file, column) or ''}")
+
+
+def text_key(column: str, text: str) -> Any:
+    """Returns the value a cell is ordered by, real dates for the date columns"""
+
+    if column in DATES:
+        found = DATE.match(text)
+        if not found:
+            return (0,) if not text else (9999, text)
+
+        year, month, day, hour, minute, meridiem = found.groups()
+        hours = int(hour or 0)
+        if meridiem:
+            hours = hours % 12 + (12 if meridiem.upper() == "PM" else 0)
+
+        return (int(year), int(month), int(day), hours, int(minute or 0))
+
+    return text.lower()
+
+
+def insertion_index(
+    key_at: Callable[[int], Any], count: int, key: Any, reverse: bool
+) -> int:
+    """Finds where a key goes among ordered ones, reading as few as possible"""
+
+    low, high = 0, count
+
+    while low < high:
+        middle = (low + high) // 2
+        current = key_at(middle)
+
+        if (current > key) if reverse else (current < key):
+            low = middle + 1
+        else:
+            high = middle
+
+    return low
+
+
+class TableModel(ABC):
+    """Rows of a table in the order chosen by its header"""
+
+    def __init__(self) -> None:
+        self.column = "description"
+        self.reverse = False
+
+    @abstractmethod
+    def count(self) -> int:
+        """Returns the number of rows"""
+
+    @abstractmethod
+    def rows(self, start: int, stop: int) -> List[File]:
+        """Returns the rows between two positions"""
+
+    def sort(self, column: str, reverse: bool = False) -> None:
+        """Orders the rows by a column"""
+
+        self.column = column
+        self.reverse = reverse
+
+    @abstractmethod
+    def apply(self, change: Change) -> None:
+        """Reflects an operation on some files in the rows"""
+
+    @abstractmethod
+    def find(self, id: int) -> Optional[File]:
+        """Returns the row of a file wherever it is, if it is still there"""
+
+
+class ListModel(TableModel):
+    """Rows held in memory, such as the results of a search
+
+    The key of every row is computed once per column and every column keeps
+    its ascending order, so sorting again by a column or reversing it costs
+    no comparison at all.
+    """
+
+    def __init__(self, files: List[File]) -> None:
+        super().__init__()
+        self.files = list(files)
+        self.keys: Dict[str, Dict[Optional[int], Any]] = dict()
+        self.orders: Dict[str, List[File]] = dict()
+
+    def count(self) -> int:
+        return len(self.files)
+
+    def rows(self, start: int, stop: int) -> List[File]:
+        start, stop = max(start, 0), min(stop, len(self.files))
+
+        if not self.reverse:
+            return self.files[start:stop]
+
+        total = len(self.files)
+        return self.files[total - stop : total - start][::-1]
+
+    def sort(self, column: str, reverse: bool = False) -> None:
+        super().sort(column, reverse)
+
+        if column not in self.orders:
+            keys = self.__keys(column)
+            self.orders[column] = sorted(self.files, key=lambda file: keys[file.id])
+
+        self.files = self.orders[column]
+
+    def apply(self, change: Change) -> None:
+        ids = {file.id for file in change.files}
+        self.files = [file for file in self.files if file.id not in ids]
+        self.orders = {self.column: self.files}
+
+        for keys in self.keys.values():
+            for id in ids:
+                keys.pop(id, None)
+
+        if change.kind == "delete":
+            return None
+
+        keys = self.__keys(self.column)
+
+        for file in change.files:
+            keys[file.id] = sort_key(file, self.column)
+            index = insertion_index(
+                lambda position: keys[self.files[position].id],
+                len(self.files),
+                keys[file.id],
+                False,
+            )
+            self.files.insert(index, file)
+
+    def find(self, id: int) -> Optional[File]:
+        return next((file for file in self.files if file.id == id), None)
+
+    def __keys(self, column: str) -> Dict[Optional[int], Any]:
+        """Returns the keys of a column, computing the ones not known yet"""
+
+        keys = self.keys.setdefault(column, dict())
+
+        for file in self.files:
+            if file.id not in keys:
+                keys[file.id] = sort_key(file, column)
+
+        return keys
+
+
+class DatabaseModel(TableModel):
+    """Every row of the database, read a window at a time as they come into sight
+
+    Where each window ends is remembered, so the next one is read from there
+    through the index instead of counting every row before it. The windows
+    are read again once the records change, in this process or another.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.changes = file_controller.changes()
+        self.total = file_controller.count()
+        self.windows: "OrderedDict[int, List[File]]" = OrderedDict()
+        self.anchors: Dict[int, Tuple[Any, int]] = dict()
+
+    def count(self) -> int:
+        self.__refresh()
+        return self.total
+
+    def rows(self, start: int, stop: int) -> List[File]:
+        self.__refresh()
+        start, stop = max(start, 0), min(stop, self.total)
+        found: List[File] = list()
+
+        for number in range(start // WINDOW, (stop - 1) // WINDOW + 1):
+            found.extend(self.__window(number))
+
+        offset = start - start // WINDOW * WINDOW
+        return found[offset : offset + stop - start]
+
+    def sort(self, column: str, reverse: bool = False) -> None:
+        super().sort(column, reverse)
+        self.windows.clear()
+        self.anchors.clear()
+
+    def apply(self, change: Change) -> None:
+        # The database already holds the change, only the windows in sight are read
+        self.__refresh()
+
+    def find(self, id: int) -> Optional[File]:
+        self.__refresh()
+
+        for rows in self.windows.values():
+            for file in rows:
+                if file.id == id:
+                    return file
+
+        return file_controller.find(id)
+
+    def __refresh(self) -> None:
+        """Forgets the windows read if the records changed since"""
+
+        changes = file_controller.changes()
+        if changes == self.changes:
+            return None
+
+        self.changes = changes
+        self.total = file_controller.count()
+        self.windows.clear()
+        self.anchors.clear()
+
+    def __window(self, number: int) -> List[File]:
+        """Returns a window of rows, reading it if it is not kept"""
+
+        if number in self.windows:
+            self.windows.move_to_end(number)
+            return self.windows[number]
+
+        # The closest window before this one whose end is known
+        known = max((anchor for anchor in self.anchors if anchor < number), default=-1)
+        after = self.anchors.get(known)
+        offset = (number - known - 1) * WINDOW
+
+        rows, anchor = file_controller.window(
+            offset, WINDOW, self.column, self.reverse, after
+        )
+        self.windows[number] = rows
+        if anchor is not None:
+            self.anchors[number] = anchor
+
+        if len(self.windows) > WINDOWS:
+            self.windows.popitem(last=False)
+
+        return rows
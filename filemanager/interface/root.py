@@ -5,7 +5,7 @@ from pathlib import Path
 import customtkinter as ctk
 
 from . import functions
-from .frames import DataTable, OptionsBar
+from .frames import DataTable, JobPanel, OptionsBar
 
 WIDTH = 800
 HEIGHT = 600
@@ -34,11 +34,13 @@ class FileManager(ctk.CTk):
         self.options_bar = OptionsBar(self.background, self)
         self.container_table = ctk.CTkFrame(self.background)
         self.data_table = DataTable(self.container_table)
+        self.job_panel = JobPanel(self.background)
 
         self.background.pack(side="top", fill="both", expand=True)
         self.options_bar.grid(row=0, column=0, sticky="n", padx=10, pady=10)
         self.container_table.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
         self.data_table.pack(side="top", fill="both", expand=True, padx=5, pady=5)
+        self.job_panel.grid(row=2, column=0, sticky="ew", padx=10, pady=(0, 10))
 
         self.background.grid_columnconfigure(0, weight=1)
         self.background.grid_rowconfigure(1, weight=1)
@@ -50,8 +52,10 @@ class FileManager(ctk.CTk):
         self.options_bar.configure(fg_color=("#DCDBAC", "#323446"))
         self.container_table.configure(fg_color=("#DCDBAC", "#323446"))
         self.data_table.configure(fg_color=("transparent"))
+        self.job_panel.configure(fg_color=("#DCDBAC", "#323446"))
 
         # Binds
         self.bind(
             "<Escape>", lambda e: functions.clear_selection(self.data_table.table)
         )
+        self.bind("<F5>", lambda e: functions.load_table(self.data_table.table))
@@ -0,0 +1,168 @@
+"""Search as the user types, away from the interface thread"""
+
+import queue
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from ..controller import file_controller
+from ..models.entities import File
+
+DEBOUNCE = 250
+POLL = 20
+
+# Searches whose results are kept to narrow the following ones in memory
+CACHED = 32
+
+Found = Tuple[List[File], List[Tuple[str, ...]]]
+
+
+class LiveSearch:
+    """Runs the latest search typed on a worker with its own read connection
+
+    Keystrokes closer than DEBOUNCE milliseconds are a single search, and the
+    results of a search are dropped if a newer one was typed meanwhile. A
+    search that only adds letters or words to a previous one filters the
+    previous results instead of querying the database.
+    """
+
+    def __init__(self, widget: Any, show: Callable[[Optional[List[File]]], None]):
+        self.widget = widget
+        self.show = show
+        self.text: Optional[str] = None
+        self.latest = 0
+        self.version = 0
+        self.pending: Optional[str] = None
+        self.running: Optional[Future] = None
+        self.polling = False
+        self.found: "OrderedDict[Tuple[str, ...], Found]" = OrderedDict()
+        self.received: "queue.Queue[Tuple[int, int, Tuple[str, ...], Future]]" = (
+            queue.Queue()
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, initializer=file_controller.read_only
+        )
+
+    def request(self, text: str, delay: int = DEBOUNCE) -> None:
+        """Searches the text once no other keystroke arrives for the delay"""
+
+        # Keys that move the cursor or select text change nothing
+        if delay and text == self.text:
+            return None
+
+        self.text = text
+        self.latest += 1
+
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+
+        self.pending = self.widget.after(delay, self.__start, text, self.latest)
+
+    def clear(self) -> None:
+        """Forgets the results kept, after the files changed"""
+
+        self.version += 1
+        self.found.clear()
+
+    def __start(self, text: str, search: int) -> None:
+        """Shows the search from memory when possible, else queries the worker"""
+
+        self.pending = None
+        terms = tuple(file_controller.search_terms(text))
+
+        if not terms:
+            self.show(None)
+            return None
+
+        narrowed = self.__narrow(terms)
+        if narrowed is not None:
+            self.__keep(terms, narrowed)
+            self.show(narrowed[0])
+            return None
+
+        # A search still waiting for the worker is outdated by this one
+        if self.running is not None:
+            self.running.cancel()
+
+        version = self.version
+        self.running = self.executor.submit(self.__query, text)
+        self.running.add_done_callback(
+            lambda done: self.received.put((search, version, terms, done))
+        )
+
+        if not self.polling:
+            self.polling = True
+            self.widget.after(POLL, self.__receive)
+
+    def __receive(self) -> None:
+        """Shows the results of the latest search, discarding older ones
+
+        A failed search is reported only if it is the latest one, and never
+        stops the following searches from being received.
+        """
+
+        error: Optional[BaseException] = None
+
+        try:
+            while not self.received.empty():
+                search, version, terms, done = self.received.get_nowait()
+
+                if done is self.running:
+                    self.running = None
+
+                if done.cancelled():
+                    continue
+
+                if done.exception() is not None:
+                    if search == self.latest:
+                        error = done.exception()
+                    continue
+
+                found = done.result()
+
+                if version == self.version:
+                    self.__keep(terms, found)
+
+                if search == self.latest:
+                    self.show(found[0])
+        finally:
+            if self.running is None:
+                self.polling = False
+            else:
+                self.widget.after(POLL, self.__receive)
+
+        if error is not None:
+            raise error
+
+    def __narrow(self, terms: Tuple[str, ...]) -> Optional[Found]:
+        """Filters the results of a broader search kept in memory, if any"""
+
+        for known in reversed(self.found):
+            if not file_controller.search_narrows(list(known), list(terms)):
+                continue
+
+            files, tokens = self.found[known]
+            kept = [
+                (file, words)
+                for file, words in zip(files, tokens)
+                if file_controller.search_matches(list(terms), words)
+            ]
+            return [file for file, _ in kept], [words for _, words in kept]
+
+        return None
+
+    def __keep(self, terms: Tuple[str, ...], found: Found) -> None:
+        """Remembers the results of a search, forgetting the oldest ones"""
+
+        self.found[terms] = found
+        self.found.move_to_end(terms)
+
+        if len(self.found) > CACHED:
+            self.found.popitem(last=False)
+
+    @staticmethod
+    def __query(text: str) -> Found:
+        """Searches the database and splits the results into words, on the worker"""
+
+        files = file_controller.details(File(description=text))
+        return files, [file_controller.search_tokens(file) for file in files]
@@ -1,4 +1,5 @@
 """Raise the path of toplevels"""
 
+from .backup import BackupWindow
 from .entry import EntryWindow
 from .notification import NotificationWindow
@@ -0,0 +1,44 @@
+"""External window to back up or restore the stored files"""
+
+from pathlib import Path
+
+import customtkinter as ctk
+
+WIDTH = 300
+HEIGHT = 140
+
+MODES = ("Folder", "Archive")
+
+FAVICON = Path.cwd() / "filemanager" / "static" / "img" / "favicon.ico"
+
+
+class BackupWindow(ctk.CTkToplevel):
+    """Defining the backup and restore window"""
+
+    def __init__(self):
+        super().__init__()
+
+        X = (self.winfo_screenwidth() / 2) - (WIDTH / 2)
+        Y = (self.winfo_screenheight() / 2) - (HEIGHT / 2)
+
+        self.maxsize(WIDTH, HEIGHT)
+        self.minsize(WIDTH, HEIGHT)
+        self.geometry(f"{WIDTH}x{HEIGHT}+{int(X)}+{int(Y)}")
+        self.iconbitmap(FAVICON)
+        self.grid_columnconfigure((0, 1), weight=1)
+
+        self.label = ctk.CTkLabel(self, text="Back up or restore the stored files")
+        self.mode_button = ctk.CTkSegmentedButton(self, values=list(MODES))
+        self.mode_button.set(MODES[0])
+        self.backup_button = ctk.CTkButton(
+            self, text="Back up", width=120, font=ctk.CTkFont(weight="bold")
+        )
+        self.restore_button = ctk.CTkButton(self, text="Restore", width=120)
+
+        self.label.grid(row=0, column=0, columnspan=2, pady=10)
+        self.mode_button.grid(row=1, column=0, columnspan=2, pady=(0, 10))
+        self.backup_button.grid(row=2, column=0, padx=5)
+        self.restore_button.grid(row=2, column=1, padx=5)
+
+        # Binds
+        self.bind("<Escape>", lambda e: self.destroy())
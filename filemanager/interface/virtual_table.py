@@ -0,0 +1,270 @@
+"""Table that only holds the rows in sight, read from a model as it scrolls"""
+
+from tkinter import ttk
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from ..models.entities import Change, File
+from .model import ListModel, TableModel
+
+# Rows kept below the visible ones, so a small scroll needs no reading
+BUFFER = 10
+
+# Height in pixels of the headings above the rows
+HEADING = 25
+
+# Modifiers of a click or key press that extend the selection instead
+EXTEND = 0x0001 | 0x0004
+
+
+class VirtualTable(ttk.Treeview):
+    """Treeview whose rows are the window of a model currently in sight
+
+    The scrollbar follows the position in the model rather than the items of
+    the Treeview. The selection is remembered by row identifier, so it
+    survives rows scrolling out of sight and back.
+    """
+
+    def __init__(self, parent: Any, **kwargs: Any) -> None:
+        super().__init__(parent, **kwargs)
+
+        self.model: TableModel = ListModel(list())
+        self.first = 0
+        self.scrolled: Optional[Callable[[float, float], None]] = None
+        self.selected: Set[str] = set()
+        self.values: Dict[str, Tuple[str, ...]] = dict()
+        self.focused = ""
+        self.render_row: Optional[Callable[[ttk.Treeview, Any], None]] = None
+
+        self.bind("<Configure>", lambda e: self.render())
+        self.bind("<MouseWheel>", lambda e: self.__scroll(-e.delta // 40))
+        self.bind("<Button-4>", lambda e: self.__scroll(-3))
+        self.bind("<Button-5>", lambda e: self.__scroll(3))
+        self.bind("<Button-1>", self.__click, add="+")
+        self.bind("<Up>", lambda e: self.__move(-1, e.state & EXTEND))
+        self.bind("<Down>", lambda e: self.__move(1, e.state & EXTEND))
+        self.bind("<Prior>", lambda e: self.__scroll(-self.visible()))
+        self.bind("<Next>", lambda e: self.__scroll(self.visible()))
+        self.bind("<Home>", lambda e: self.__scroll(-self.model.count()))
+        self.bind("<End>", lambda e: self.__scroll(self.model.count()))
+
+    def show(self, model: TableModel) -> None:
+        """Displays the rows of a model from the top, keeping its order"""
+
+        model.sort(self.model.column, self.model.reverse)
+        self.model = model
+        self.first = 0
+        self.render()
+
+    def sort(self, column: str, reverse: bool = False) -> None:
+        """Orders the model by a column and displays it from the top"""
+
+        self.model.sort(column, reverse)
+        self.first = 0
+        self.render()
+
+    def apply(self, change: Change) -> None:
+        """Reflects an operation on some files, rendering only the rows in sight"""
+
+        self.model.apply(change)
+
+        self.__remember()
+
+        for file in change.files:
+            if change.kind == "delete":
+                self.selected.discard(f"{file.id}")
+                self.values.pop(f"{file.id}", None)
+            elif f"{file.id}" in self.values:
+                self.values[f"{file.id}"] = self.__cells(file)
+
+        if self.focused not in self.selected:
+            self.focused = ""
+
+        self.render()
+
+    def visible(self) -> int:
+        """Returns how many rows fit in the height of the table"""
+
+        height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        return max(1, (self.winfo_height() - HEADING) // height)
+
+    def render(self) -> None:
+        """Replaces the rows in the Treeview with the ones in sight"""
+
+        self.__remember()
+
+        total = self.model.count()
+        self.first = max(0, min(self.first, total - self.visible()))
+        rows = self.model.rows(self.first, self.first + self.visible() + BUFFER)
+
+        super().delete(*super().get_children())
+
+        for row in rows:
+            if self.render_row is not None:
+                self.render_row(self, row)
+
+        shown = [iid for iid in super().get_children() if iid in self.selected]
+        super().selection_set(shown)
+
+        if self.focused and super().exists(self.focused):
+            super().focus(self.focused)
+
+        if self.scrolled is not None:
+            end = self.first + self.visible()
+            self.scrolled(*self.__fractions(self.first, end, total))
+
+    def yview(self, *args: Any) -> Any:
+        """Moves through the model as the scrollbar asks"""
+
+        if not args:
+            end = self.first + self.visible()
+            return self.__fractions(self.first, end, self.model.count())
+
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * self.model.count())
+            self.render()
+        elif args[0] == "scroll":
+            step = self.visible() if args[2] == "pages" else 1
+            self.__scroll(int(args[1]) * step)
+
+        return None
+
+    def selection(self) -> Tuple[str, ...]:  # type: ignore
+        """Returns the selected rows, including the ones out of sight"""
+
+        self.__remember()
+        return tuple(self.selected)
+
+    def selection_remove(self, *items: Any) -> None:  # type: ignore
+        """Deselects rows, whether they are in sight or not"""
+
+        for item in items:
+            self.selected.discard(f"{item}")
+            if super().exists(item):
+                super().selection_remove(item)
+
+        if self.focused not in self.selected:
+            self.focused = ""
+
+    def item(self, item: Any, option: Optional[str] = None, **kwargs: Any) -> Any:
+        """Describes a row, answering for the rows that are out of sight"""
+
+        if option == "values" and not kwargs and not super().exists(item):
+            if f"{item}" in self.values:
+                return self.values[f"{item}"]
+
+            file = self.model.find(int(item))
+            if file is not None:
+                return self.__cells(file)
+
+        return super().item(item, option, **kwargs)
+
+    def focus(self, item: Optional[str] = None) -> Any:
+        """Returns the row with the focus, even when it is out of sight"""
+
+        if item is not None:
+            self.focused = f"{item}"
+            return super().focus(item)
+
+        self.__remember()
+        return self.focused
+
+    def __remember(self) -> None:
+        """Takes the selection of the rows in sight from the Treeview"""
+
+        shown = set(super().get_children())
+        self.selected = (self.selected - shown) | set(super().selection())
+
+        for iid in super().selection():
+            self.values[iid] = super().item(iid, "values")
+
+        for iid in set(self.values) - self.selected:
+            del self.values[iid]
+
+        focused = super().focus()
+        if focused:
+            self.focused = focused
+        elif self.focused in shown:
+            self.focused = ""
+
+    def __click(self, event: Any) -> None:
+        """Forgets the rows out of sight when a plain click replaces the selection"""
+
+        if event.state & EXTEND:
+            return None
+
+        if super().identify_region(event.x, event.y) in ("cell", "tree"):
+            self.__forget_hidden()
+
+    def __forget_hidden(self) -> None:
+        """Deselects the rows out of sight, as replacing the selection does"""
+
+        self.__remember()
+
+        shown = set(super().get_children())
+        self.selected &= shown
+
+        for iid in set(self.values) - shown:
+            del self.values[iid]
+
+        if self.focused not in shown:
+            self.focused = ""
+
+    def __scroll(self, rows: int) -> str:
+        """Moves the rows in sight by the amount received"""
+
+        self.first += rows
+        self.render()
+        return "break"
+
+    def __move(self, step: int, extend: int) -> Optional[str]:
+        """Moves the selection a row, scrolling when it reaches an edge"""
+
+        children = super().get_children()
+        focused = super().focus()
+
+        if not children or focused not in children:
+            return None
+
+        if not extend:
+            self.__forget_hidden()
+
+        position = children.index(focused) + step
+
+        if 0 <= position < min(len(children), self.visible()):
+            return None
+
+        self.__scroll(step)
+        children = super().get_children()
+        position = min(max(position - step, 0), len(children) - 1)
+
+        if children:
+            if extend:
+                super().selection_add(children[position])
+            else:
+                super().selection_set(children[position])
+            super().focus(children[position])
+            super().see(children[position])
+
+        return "break"
+
+    @staticmethod
+    def __cells(file: File) -> Tuple[str, ...]:
+        """Returns the values a row of a file shows"""
+
+        return (
+            f"{file.description}",
+            f"{file.modification}",
+            f"{file.expiration}",
+            f"{file.extension}",
+            f"{file.label}",
+        )
+
+    @staticmethod
+    def __fractions(start: int, end: int, total: int) -> Tuple[float, float]:
+        """Returns the part of the model in sight, as the scrollbar expects it"""
+
+        if total <= 0:
+            return 0.0, 1.0
+
+        return start / total, min(end, total) / total
+
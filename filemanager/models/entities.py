@@ -1,6 +1,6 @@
 """Structures focused on the transmission of information throughout the application"""
 
-from typing import NamedTuple, Optional
+from typing import List, NamedTuple, Optional, Tuple
 
 
 class File(NamedTuple):
@@ -13,3 +13,48 @@ class File(NamedTuple):
     extension: Optional[str] = None
     label: Optional[str] = None
     path: Optional[str] = None
+    digest: Optional[str] = None
+    expired: Optional[bool] = None
+
+
+class Failure(NamedTuple):
+    """Pairs a file with the error that prevented its processing"""
+
+    file: File
+    error: Exception
+
+
+class BatchResult(NamedTuple):
+    """Outcome of an operation applied to several files"""
+
+    succeeded: List[File]
+    failed: List[Failure]
+
+
+class Change(NamedTuple):
+    """Files affected by an operation: inserted, updated or deleted"""
+
+    kind: str
+    files: List[File]
+
+
+class QueryStats(NamedTuple):
+    """Accumulated measurements of a database statement"""
+
+    calls: int
+    total_ms: float
+    max_ms: float
+    rows: int
+    histogram: Tuple[Tuple[float, int], ...]
+
+
+class ScanReport(NamedTuple):
+    """Disagreements found between the catalog and the local storage"""
+
+    orphans: List[str]
+    missing: List[File]
+    mismatched: List[str]
+    corrupted: List[str]
+    miscounted: List[str]
+    checked: int
+    repaired: bool
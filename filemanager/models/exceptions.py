@@ -15,3 +15,7 @@ class FileNotFound(Exception):
 
 class FileNotValid(Exception):
     pass
+
+
+class TransferCancelled(Exception):
+    pass